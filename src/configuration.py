@@ -1,7 +1,9 @@
+import hashlib
 import json
 import logging
 import re
 from pathlib import Path
+from typing import Any, NamedTuple
 
 from awsiot.greengrasscoreipc.model import GetConfigurationResponse, GetSecretValueResponse
 
@@ -11,15 +13,169 @@ from src.constants import (
     DEFAULT_CONTAINER_NAME,
     DEFAULT_HOST_PORT,
     DEFAULT_HOST_VOLUME,
+    DEFAULT_IMAGE_CONFIG,
+    DEFAULT_INITDB_CONFIG,
+    DEFAULT_MAINTENANCE_CONFIG,
+    DEFAULT_PARTITIONED_TABLE_CONFIG,
+    DEFAULT_PARTITIONING_CONFIG,
+    DEFAULT_PROBE_CONFIG,
+    DEFAULT_QUERY_STATISTICS_CONFIG,
     HOST_PORT_KEY,
     HOST_VOLUME_KEY,
+    IMAGE_ARCHIVE_READ_CHUNK_BYTES,
+    IMAGE_KEY,
+    IMAGE_SERVER_VERSION_KEY,
+    INITDB_AUTH_METHOD_KEY,
+    INITDB_KEY,
+    INITDB_SCRIPTS_KEY,
+    INITDB_WAL_SEGMENT_SIZE_KEY,
+    MAINTENANCE_KEY,
+    PARTITION_EXPIRED_ACTION_KEY,
+    PARTITION_INTERVAL_KEY,
+    PARTITION_TABLE_KEY,
+    PARTITION_TIME_COLUMN_KEY,
+    PARTITIONING_KEY,
+    PARTITIONING_TABLES_KEY,
+    PG_STAT_STATEMENTS_LIBRARY,
     POSTGRES_PASSWORD_KEY,
     POSTGRES_SERVER_CONFIGURATION_FILES_KEY,
     POSTGRES_USERNAME_KEY,
+    PROBE_KEY,
+    QUERY_STATISTICS_ENABLED_KEY,
+    QUERY_STATISTICS_KEY,
     SUPPORTED_CONFIGURATION_FILES,
+    SUPPORTED_EXPIRED_PARTITION_ACTIONS,
+    SUPPORTED_INIT_SCRIPT_SUFFIXES,
+    SUPPORTED_INITDB_AUTH_METHODS,
+    SUPPORTED_PARTITION_INTERVALS,
 )
 
 
+def get_file_digest(file_path: Path) -> str:
+    "Returns the sha256 digest of a file as sha256:<hex>"
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(IMAGE_ARCHIVE_READ_CHUNK_BYTES), b""):
+            file_hash.update(chunk)
+    return f"sha256:{file_hash.hexdigest()}"
+
+
+def _get_file_digest_or_none(file_path: Path) -> str:
+    try:
+        return get_file_digest(file_path)
+    except OSError:
+        return None
+
+
+def _freeze(value):
+    "Converts dictionaries and lists (recursively) to sorted tuples, so that the value is immutable and hashable"
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class FieldChange(NamedTuple):
+    """
+    A field that differs between two configuration snapshots.
+    """
+
+    field: str
+    old_value: Any
+    new_value: Any
+    requires_new_container: bool
+
+
+class ConfigurationSnapshot:
+    """
+    Immutable view of a ComponentConfiguration used for change detection. Field values are frozen to tuples, the
+    password is only kept as a digest and configuration files as their path and content digest, so that the snapshot
+    can be hashed, compared and persisted (as its container fingerprint) without exposing secrets.
+    """
+
+    FIELDS = (
+        "container_name",
+        "host_port",
+        "host_volume",
+        "db_credentials",
+        "pg_config_files",
+        "image",
+        "server_version",
+        "preload_libraries",
+        "query_statistics",
+        "maintenance",
+        "initdb",
+        "probe",
+        "partitioning",
+    )
+    # Fields that are only applied by creating a new container
+    CONTAINER_FIELDS = frozenset(
+        (
+            "container_name",
+            "host_port",
+            "host_volume",
+            "db_credentials",
+            "pg_config_files",
+            "image",
+            "preload_libraries",
+        )
+    )
+
+    __slots__ = FIELDS + ("fingerprint", "container_fingerprint", "_hash")
+
+    def __init__(self, **fields) -> None:
+        for name in self.FIELDS:
+            object.__setattr__(self, name, _freeze(fields[name]))
+        object.__setattr__(self, "fingerprint", self._get_fingerprint(self.FIELDS))
+        # Identifies the container created for the configuration, the other fields are applied without a new container
+        object.__setattr__(
+            self,
+            "container_fingerprint",
+            self._get_fingerprint([name for name in self.FIELDS if name in self.CONTAINER_FIELDS]),
+        )
+        object.__setattr__(self, "_hash", hash(self.fingerprint))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, ConfigurationSnapshot):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"{type(self).__name__}(fingerprint={self.fingerprint})"
+
+    def _get_fingerprint(self, names) -> str:
+        canonical = json.dumps([getattr(self, name) for name in names], separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def diff(self, other: "ConfigurationSnapshot") -> tuple:
+        """
+        Compares this snapshot with a newer one.
+
+        Args
+            other(ConfigurationSnapshot): Newer snapshot.
+
+        Returns
+            Tuple of FieldChange records, one per changed field, empty if the snapshots are equal
+        """
+        if self == other:
+            return ()
+        return tuple(
+            FieldChange(name, getattr(self, name), getattr(other, name), name in self.CONTAINER_FIELDS)
+            for name in self.FIELDS
+            if getattr(self, name) != getattr(other, name)
+        )
+
+
 class ComponentConfiguration:
     """
     This data class holds the configuration of the postgresql component at any given state
@@ -32,19 +188,24 @@ class ComponentConfiguration:
         self.__db_username = ""
         self.__db_password = ""
         self.__pg_config_files = {}
+        self.__maintenance_config = self._get_section_config(config_response, MAINTENANCE_KEY, DEFAULT_MAINTENANCE_CONFIG)
+        self.__query_statistics_config = self._get_section_config(
+            config_response, QUERY_STATISTICS_KEY, DEFAULT_QUERY_STATISTICS_CONFIG
+        )
+        self.__image_config = self._get_section_config(config_response, IMAGE_KEY, DEFAULT_IMAGE_CONFIG)
+        self.__initdb_config = self._get_initdb_config(config_response)
+        self.__probe_config = self._get_section_config(config_response, PROBE_KEY, DEFAULT_PROBE_CONFIG)
+        self.__partitioning_config = self._get_partitioning_config(config_response)
         self._set_container_config(config_response)
         self._set_credential_secret(secret_reponse)
         self._set_configuration_files(config_response)
+        self.__snapshot = None
 
     def __eq__(self, other):
-        return (
-            self.get_container_name() == other.get_container_name()
-            and self.get_container_name() == other.get_container_name()
-            and self.get_host_volume() == other.get_host_volume()
-            and self.get_host_port() == other.get_host_port()
-            and self.get_db_credentials() == other.get_db_credentials()
-            and self.get_pg_config_files() == other.get_pg_config_files()
-        )
+        return self.snapshot() == other.snapshot()
+
+    def __hash__(self):
+        return hash(self.snapshot())
 
     def _set_container_config(self, config_response: GetConfigurationResponse):
         """
@@ -89,6 +250,110 @@ class ComponentConfiguration:
                 continue
             self.__pg_config_files[conf_file] = conf_file_abs_path
 
+    def _get_section_config(self, config_response: GetConfigurationResponse, section_key: str, defaults: dict) -> dict:
+        """
+        Helper function to read an optional configuration section (e.g. Maintenance) merged over its default values.
+        Unknown keys are ignored and missing keys keep their default values.
+
+        Args
+            config_response(GetConfigurationResponse): Configuration response object obtained via IPC.
+            section_key(str): Key of the configuration section.
+            defaults(dict): Default values of the section.
+
+        Returns
+            Configuration of the section
+        """
+        section_config = dict(defaults)
+        for key, value in (config_response.value.get(section_key) or {}).items():
+            if key not in defaults:
+                logging.warning("{}/{} is not a supported configuration and will be ignored.".format(section_key, key))
+                continue
+            section_config[key] = value
+        return section_config
+
+    def _get_initdb_config(self, config_response: GetConfigurationResponse) -> dict:
+        """
+        Helper function to read the Initdb configuration section. Init scripts are resolved to absolute paths, scripts
+        that are not a file or not supported by the image entrypoint are ignored.
+
+        Args
+            config_response(GetConfigurationResponse): Configuration response object obtained via IPC.
+
+        Returns
+            Initdb configuration
+        """
+        initdb_config = self._get_section_config(config_response, INITDB_KEY, DEFAULT_INITDB_CONFIG)
+        wal_segment_size = initdb_config[INITDB_WAL_SEGMENT_SIZE_KEY]
+        if not isinstance(wal_segment_size, int) or wal_segment_size not in [2**exponent for exponent in range(11)]:
+            raise Exception(
+                f"Invalid {INITDB_KEY}/{INITDB_WAL_SEGMENT_SIZE_KEY}: {wal_segment_size}. The WAL segment size must be a power"
+                " of 2 between 1 and 1024 (MB)."
+            )
+        auth_method = initdb_config[INITDB_AUTH_METHOD_KEY]
+        if auth_method and auth_method not in SUPPORTED_INITDB_AUTH_METHODS:
+            raise Exception(
+                f"Invalid {INITDB_KEY}/{INITDB_AUTH_METHOD_KEY}: {auth_method}. Supported authentication methods:"
+                f" {', '.join(SUPPORTED_INITDB_AUTH_METHODS)}"
+            )
+        init_scripts = []
+        for script_path in initdb_config[INITDB_SCRIPTS_KEY] or []:
+            script_abs_path = Path(script_path).absolute()
+            if not script_abs_path.name.endswith(SUPPORTED_INIT_SCRIPT_SUFFIXES):
+                logging.warning(
+                    "{} will not be used as is not a supported init script. Supported init scripts: {}".format(
+                        script_abs_path, SUPPORTED_INIT_SCRIPT_SUFFIXES
+                    )
+                )
+                continue
+            if not script_abs_path.is_file():
+                logging.warning("{} will not be used as is not a valid file path.".format(script_abs_path))
+                continue
+            init_scripts.append(script_abs_path)
+        initdb_config[INITDB_SCRIPTS_KEY] = init_scripts
+        return initdb_config
+
+    def _get_partitioning_config(self, config_response: GetConfigurationResponse) -> dict:
+        """
+        Helper function to read the Partitioning configuration section. Every table configuration is merged over the
+        default table configuration, tables with a missing name or time column or an unsupported setting are ignored.
+
+        Args
+            config_response(GetConfigurationResponse): Configuration response object obtained via IPC.
+
+        Returns
+            Partitioning configuration
+        """
+        partitioning_config = self._get_section_config(config_response, PARTITIONING_KEY, DEFAULT_PARTITIONING_CONFIG)
+        tables = []
+        for table_config in partitioning_config[PARTITIONING_TABLES_KEY] or []:
+            table_config = {**DEFAULT_PARTITIONED_TABLE_CONFIG, **table_config}
+            if not table_config[PARTITION_TABLE_KEY] or not table_config[PARTITION_TIME_COLUMN_KEY]:
+                logging.warning(
+                    "{}/{} entry {} will be ignored as {} or {} is missing.".format(
+                        PARTITIONING_KEY, PARTITIONING_TABLES_KEY, table_config, PARTITION_TABLE_KEY, PARTITION_TIME_COLUMN_KEY
+                    )
+                )
+                continue
+            if table_config[PARTITION_INTERVAL_KEY] not in SUPPORTED_PARTITION_INTERVALS:
+                logging.warning(
+                    "{} will not be partitioned as {} is not supported. Supported partition intervals: {}".format(
+                        table_config[PARTITION_TABLE_KEY], table_config[PARTITION_INTERVAL_KEY], SUPPORTED_PARTITION_INTERVALS
+                    )
+                )
+                continue
+            if table_config[PARTITION_EXPIRED_ACTION_KEY] not in SUPPORTED_EXPIRED_PARTITION_ACTIONS:
+                logging.warning(
+                    "{} will not be partitioned as {} is not supported. Supported expired partition actions: {}".format(
+                        table_config[PARTITION_TABLE_KEY],
+                        table_config[PARTITION_EXPIRED_ACTION_KEY],
+                        SUPPORTED_EXPIRED_PARTITION_ACTIONS,
+                    )
+                )
+                continue
+            tables.append(table_config)
+        partitioning_config[PARTITIONING_TABLES_KEY] = tables
+        return partitioning_config
+
     def _set_credential_secret(self, secret_response: GetSecretValueResponse) -> None:
         """
         Sets configuration with the superuser credentials (username and password) obtained from the secrets manager
@@ -155,3 +420,60 @@ class ComponentConfiguration:
     def get_pg_config_files(self):
         "Returns server configuration files"
         return self.__pg_config_files
+
+    def get_image_config(self):
+        "Returns docker image configuration"
+        return self.__image_config
+
+    def get_maintenance_config(self):
+        "Returns maintenance scheduler configuration"
+        return self.__maintenance_config
+
+    def get_query_statistics_config(self):
+        "Returns query statistics reporting configuration"
+        return self.__query_statistics_config
+
+    def get_initdb_config(self):
+        "Returns cluster initialization configuration, applied when a new data volume is initialized"
+        return self.__initdb_config
+
+    def get_probe_config(self):
+        "Returns latency SLO probe configuration"
+        return self.__probe_config
+
+    def get_partitioning_config(self):
+        "Returns time partitioned table management configuration"
+        return self.__partitioning_config
+
+    def snapshot(self) -> ConfigurationSnapshot:
+        "Returns the immutable snapshot of the configuration, computed once"
+        if self.__snapshot is None:
+            pg_config_files = [
+                (conf_file, str(file_path), _get_file_digest_or_none(file_path))
+                for conf_file, file_path in self.__pg_config_files.items()
+            ]
+            initdb = dict(self.__initdb_config)
+            initdb[INITDB_SCRIPTS_KEY] = [
+                (str(script_path), _get_file_digest_or_none(script_path)) for script_path in initdb[INITDB_SCRIPTS_KEY]
+            ]
+            preload_libraries = []
+            if self.__query_statistics_config[QUERY_STATISTICS_ENABLED_KEY]:
+                preload_libraries.append(PG_STAT_STATEMENTS_LIBRARY)
+            # The server version only selects the settings catalog of the validation, so it does not recreate the container
+            image = {key: value for key, value in self.__image_config.items() if key != IMAGE_SERVER_VERSION_KEY}
+            self.__snapshot = ConfigurationSnapshot(
+                container_name=self.__container_name,
+                host_port=str(self.__host_port),
+                host_volume=str(self.__host_volume),
+                db_credentials=(self.__db_username, hashlib.sha256(self.__db_password.encode()).hexdigest()),
+                pg_config_files=sorted(pg_config_files),
+                image=image,
+                server_version=self.__image_config[IMAGE_SERVER_VERSION_KEY],
+                preload_libraries=preload_libraries,
+                query_statistics=self.__query_statistics_config,
+                maintenance=self.__maintenance_config,
+                initdb=initdb,
+                probe=self.__probe_config,
+                partitioning=self.__partitioning_config,
+            )
+        return self.__snapshot
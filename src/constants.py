@@ -22,3 +22,155 @@ POSTGRES_SERVER_CONFIGURATION_FILES_KEY = "ConfigurationFiles"
 SUPPORTED_CONFIGURATION_FILES = {"postgresql.conf": "config_file", "pg_hba.conf": "hba_file", "pg_ident.conf": "ident_file"}
 CUSTOM_FILES = "/custom_files"
 SECRETS_KEY = "secrets"
+DATABASE_HOST = "localhost"
+DATABASE_CONNECT_TIMEOUT_SECONDS = 10
+MAINTENANCE_KEY = "Maintenance"
+MAINTENANCE_ENABLED_KEY = "Enabled"
+MAINTENANCE_INTERVAL_KEY = "IntervalSeconds"
+MAINTENANCE_WINDOWS_KEY = "Windows"
+MAINTENANCE_MAX_ACTIVE_BACKENDS_KEY = "MaxActiveBackends"
+MAINTENANCE_MAX_CPU_PERCENT_KEY = "MaxContainerCpuPercent"
+MAINTENANCE_DEAD_TUPLE_RATIO_KEY = "DeadTupleRatioThreshold"
+MAINTENANCE_MIN_DEAD_TUPLES_KEY = "MinDeadTuples"
+MAINTENANCE_BLOAT_RATIO_KEY = "BloatRatioThreshold"
+MAINTENANCE_REINDEX_KEY = "Reindex"
+MAINTENANCE_MAX_JOBS_KEY = "MaxJobsPerRun"
+DEFAULT_MAINTENANCE_CONFIG = {
+    MAINTENANCE_ENABLED_KEY: False,
+    MAINTENANCE_INTERVAL_KEY: 300,
+    MAINTENANCE_WINDOWS_KEY: [],
+    MAINTENANCE_MAX_ACTIVE_BACKENDS_KEY: 2,
+    MAINTENANCE_MAX_CPU_PERCENT_KEY: 50,
+    MAINTENANCE_DEAD_TUPLE_RATIO_KEY: 0.2,
+    MAINTENANCE_MIN_DEAD_TUPLES_KEY: 1000,
+    MAINTENANCE_BLOAT_RATIO_KEY: 0.4,
+    MAINTENANCE_REINDEX_KEY: True,
+    MAINTENANCE_MAX_JOBS_KEY: 5,
+}
+# Relations smaller than this are never considered bloated, the estimate is too noisy for them.
+MAINTENANCE_MIN_BLOAT_RELATION_BYTES = 1024 * 1024
+MAINTENANCE_HISTORY_SIZE = 100
+QUERY_STATISTICS_KEY = "QueryStatistics"
+QUERY_STATISTICS_ENABLED_KEY = "Enabled"
+QUERY_STATISTICS_INTERVAL_KEY = "IntervalSeconds"
+QUERY_STATISTICS_TOP_N_KEY = "TopN"
+QUERY_STATISTICS_TOPIC_KEY = "Topic"
+QUERY_STATISTICS_RESET_INTERVAL_KEY = "ResetIntervalSeconds"
+QUERY_STATISTICS_MAX_QUERY_LENGTH_KEY = "MaxQueryLength"
+DEFAULT_QUERY_STATISTICS_CONFIG = {
+    QUERY_STATISTICS_ENABLED_KEY: False,
+    QUERY_STATISTICS_INTERVAL_KEY: 300,
+    QUERY_STATISTICS_TOP_N_KEY: 10,
+    QUERY_STATISTICS_TOPIC_KEY: "greengrass/postgresql/statistics/queries",
+    QUERY_STATISTICS_RESET_INTERVAL_KEY: 86400,
+    QUERY_STATISTICS_MAX_QUERY_LENGTH_KEY: 200,
+}
+PG_STAT_STATEMENTS_LIBRARY = "pg_stat_statements"
+IMAGE_KEY = "Image"
+IMAGE_NAME_KEY = "Name"
+IMAGE_DIGEST_KEY = "Digest"
+IMAGE_ARCHIVE_PATH_KEY = "ArchivePath"
+IMAGE_ARCHIVE_DIGEST_KEY = "ArchiveDigest"
+IMAGE_SERVER_VERSION_KEY = "ServerVersion"
+DEFAULT_IMAGE_CONFIG = {
+    IMAGE_NAME_KEY: POSTGRES_IMAGE,
+    IMAGE_SERVER_VERSION_KEY: "15",
+    IMAGE_DIGEST_KEY: "",
+    IMAGE_ARCHIVE_PATH_KEY: "",
+    IMAGE_ARCHIVE_DIGEST_KEY: "",
+}
+IMAGE_ARCHIVE_READ_CHUNK_BYTES = 1024 * 1024
+IMAGE_ARCHIVE_MANIFEST_FILE = "manifest.json"
+EXECUTOR_MAX_WORKERS = 2
+STREAM_EXECUTOR_MAX_WORKERS = 2
+DOCKER_CALL_TIMEOUT_SECONDS = 120
+IMAGE_PREPARE_TIMEOUT_SECONDS = 1800
+SCHEDULED_JOB_TIMEOUT_SECONDS = 3600
+SETTINGS_CATALOG_PATH = Path(__file__).parent.joinpath("settings_catalog")
+CONFIGURATION_FINGERPRINT_FILE = "configuration.fingerprint"
+INITDB_KEY = "Initdb"
+INITDB_WAL_SEGMENT_SIZE_KEY = "WalSegmentSizeMB"
+INITDB_DATA_CHECKSUMS_KEY = "DataChecksums"
+INITDB_LOCALE_KEY = "Locale"
+INITDB_ENCODING_KEY = "Encoding"
+INITDB_AUTH_METHOD_KEY = "AuthMethod"
+INITDB_SCRIPTS_KEY = "InitScripts"
+DEFAULT_INITDB_CONFIG = {
+    INITDB_WAL_SEGMENT_SIZE_KEY: 16,
+    INITDB_DATA_CHECKSUMS_KEY: False,
+    INITDB_LOCALE_KEY: "",
+    INITDB_ENCODING_KEY: "",
+    INITDB_AUTH_METHOD_KEY: "",
+    INITDB_SCRIPTS_KEY: [],
+}
+SUPPORTED_INITDB_AUTH_METHODS = ("scram-sha-256", "md5")
+SUPPORTED_INIT_SCRIPT_SUFFIXES = (".sh", ".sql", ".sql.gz", ".sql.xz")
+POSTGRES_INITDB_ARGS_KEY = "POSTGRES_INITDB_ARGS"
+POSTGRES_HOST_AUTH_METHOD_KEY = "POSTGRES_HOST_AUTH_METHOD"
+INIT_SCRIPTS_CONTAINER_PATH = "/docker-entrypoint-initdb.d"
+INITDB_STATE_FILE = "initdb.json"
+INITDB_STATE_PENDING_KEY = "Pending"
+# Created by initdb in the data directory of a cluster
+PG_VERSION_FILE = "PG_VERSION"
+PROBE_KEY = "Probe"
+PROBE_ENABLED_KEY = "Enabled"
+PROBE_INTERVAL_KEY = "IntervalSeconds"
+PROBE_CANARIES_KEY = "Canaries"
+PROBE_SLO_KEY = "SloMilliseconds"
+PROBE_MIN_SAMPLES_KEY = "MinSamples"
+PROBE_WINDOW_KEY = "WindowSeconds"
+PROBE_ALERT_COOLDOWN_KEY = "AlertCooldownSeconds"
+PROBE_STATEMENT_TIMEOUT_KEY = "StatementTimeoutMilliseconds"
+PROBE_TOPIC_KEY = "Topic"
+PROBE_CANARY_READ = "read"
+PROBE_CANARY_WRITE = "write"
+PROBE_CANARY_COMMIT = "commit"
+DEFAULT_PROBE_CONFIG = {
+    PROBE_ENABLED_KEY: False,
+    PROBE_INTERVAL_KEY: 10,
+    PROBE_CANARIES_KEY: [PROBE_CANARY_READ, PROBE_CANARY_WRITE, PROBE_CANARY_COMMIT],
+    PROBE_SLO_KEY: {PROBE_CANARY_READ: 50, PROBE_CANARY_WRITE: 50, PROBE_CANARY_COMMIT: 100},
+    PROBE_MIN_SAMPLES_KEY: 30,
+    PROBE_WINDOW_KEY: 300,
+    PROBE_ALERT_COOLDOWN_KEY: 300,
+    PROBE_STATEMENT_TIMEOUT_KEY: 5000,
+    PROBE_TOPIC_KEY: "greengrass/postgresql/probe/alerts",
+}
+PROBE_TABLE = "greengrass_probe"
+PROBE_ALERT_QUANTILE = 0.99
+PROBE_RECOVERY_RATIO = 0.8
+PROBE_MAX_ALERT_COOLDOWN_SECONDS = 3600
+PROBE_MAX_WAIT_EVENTS = 10
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_MAX_BUCKETS = 512
+PARTITIONING_KEY = "Partitioning"
+PARTITIONING_ENABLED_KEY = "Enabled"
+PARTITIONING_INTERVAL_KEY = "IntervalSeconds"
+PARTITIONING_TABLES_KEY = "Tables"
+DEFAULT_PARTITIONING_CONFIG = {
+    PARTITIONING_ENABLED_KEY: False,
+    PARTITIONING_INTERVAL_KEY: 3600,
+    PARTITIONING_TABLES_KEY: [],
+}
+PARTITION_TABLE_KEY = "Table"
+PARTITION_TIME_COLUMN_KEY = "TimeColumn"
+PARTITION_INTERVAL_KEY = "PartitionInterval"
+PARTITION_PREMAKE_KEY = "Premake"
+PARTITION_RETENTION_DAYS_KEY = "RetentionDays"
+PARTITION_EXPIRED_ACTION_KEY = "ExpiredAction"
+PARTITION_EXPORT_DIRECTORY_KEY = "ExportDirectory"
+PARTITION_BRIN_PAGES_PER_RANGE_KEY = "BrinPagesPerRange"
+DEFAULT_PARTITIONED_TABLE_CONFIG = {
+    PARTITION_TABLE_KEY: "",
+    PARTITION_TIME_COLUMN_KEY: "",
+    PARTITION_INTERVAL_KEY: "day",
+    PARTITION_PREMAKE_KEY: 3,
+    PARTITION_RETENTION_DAYS_KEY: 0,
+    PARTITION_EXPIRED_ACTION_KEY: "drop",
+    PARTITION_EXPORT_DIRECTORY_KEY: "",
+    PARTITION_BRIN_PAGES_PER_RANGE_KEY: 32,
+}
+SUPPORTED_PARTITION_INTERVALS = ("hour", "day", "week", "month")
+SUPPORTED_EXPIRED_PARTITION_ACTIONS = ("drop", "detach")
+PARTITION_LOCK_TIMEOUT_MILLISECONDS = 5000
+PARTITIONING_FIRST_RUN_DELAY_SECONDS = 60
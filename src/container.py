@@ -1,45 +1,146 @@
+import asyncio
 import logging
+import shlex
+from enum import Enum
 from pathlib import Path
-from threading import Lock, Thread
 
 import docker.errors
 from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
 from awsiot.greengrasscoreipc.model import ConfigurationUpdateEvents
 from docker.models.containers import Container
 
-from src.configuration import ComponentConfiguration
+from src.configuration import ComponentConfiguration, ConfigurationSnapshot
 from src.configuration_handler import ComponentConfigurationIPCHandler
 from src.constants import (
+    CONFIGURATION_FINGERPRINT_FILE,
     CUSTOM_FILES,
     DEFAULT_CONTAINER_PORT,
     DEFAULT_CONTAINER_VOLUME,
     DEFAULT_DB_NAME,
+    IMAGE_PREPARE_TIMEOUT_SECONDS,
+    INITDB_STATE_FILE,
+    PG_STAT_STATEMENTS_LIBRARY,
     POSTGRES_COMMAND_DO_NOT_CHANGE,
     POSTGRES_DB_KEY,
-    POSTGRES_IMAGE,
     POSTGRES_PASSWORD_FILE_KEY,
     POSTGRES_USERNAME_FILE_KEY,
+    QUERY_STATISTICS_ENABLED_KEY,
     SECRETS_KEY,
     SUPPORTED_CONFIGURATION_FILES,
 )
+from src.executor import BlockingExecutor
+from src.image import ImageManagement
+from src.initdb import ClusterInitialization, get_init_script_volumes, get_initdb_environment
+from src.validation import get_shared_preload_libraries, validate_configuration_files
+
+
+def get_container_cpu_percent(stats: dict) -> float:
+    """
+    Computes the CPU usage of a container from a docker stats sample, in the same way as `docker stats` does.
+
+    Args
+        stats(dict): Sample returned by Container.stats(stream=False).
+
+    Returns
+        CPU usage in percent of a single CPU, or None if the sample does not contain enough data
+    """
+    cpu_stats = stats.get("cpu_stats", {})
+    precpu_stats = stats.get("precpu_stats", {})
+    cpu_delta = cpu_stats.get("cpu_usage", {}).get("total_usage", 0) - precpu_stats.get("cpu_usage", {}).get(
+        "total_usage", 0
+    )
+    system_delta = cpu_stats.get("system_cpu_usage", 0) - precpu_stats.get("system_cpu_usage", 0)
+    if system_delta <= 0 or cpu_delta < 0:
+        return None
+    online_cpus = cpu_stats.get("online_cpus") or len(cpu_stats.get("cpu_usage", {}).get("percpu_usage") or [1])
+    return cpu_delta / system_delta * online_cpus * 100.0
+
+
+class ReconcileReason(Enum):
+    STARTUP = "startup"
+    CONFIGURATION_UPDATE = "configuration_update"
+    CONTAINER_EVENT = "container_event"
 
 
 class ContainerManagement:
+    """
+    This is used to reconcile the PostgreSQL container with the component configuration. IPC configuration update events
+    and Docker container events are put on a single asyncio queue that is consumed by one reconcile task, so the
+    container is only ever changed from that task. Blocking Docker and IPC calls run on bounded executors with timeouts.
+    """
+
     def __init__(
-        self, ipc_client: GreengrassCoreIPCClientV2, docker_client: Container, config_handler: ComponentConfigurationIPCHandler
+        self,
+        ipc_client: GreengrassCoreIPCClientV2,
+        docker_client: Container,
+        config_handler: ComponentConfigurationIPCHandler,
+        executor: BlockingExecutor,
+        stream_executor: BlockingExecutor,
     ) -> None:
         self.__ipc_client = ipc_client
         self.config_handler = config_handler
         self.docker_client = docker_client
+        self.executor = executor
+        self.stream_executor = stream_executor
         self.postgresql_container = None
-        self.lock = Lock()
-        self.current_configuration = config_handler.get_configuration()
+        self.postgresql_image = None
+        self.image_management = ImageManagement(docker_client)
+        self.reconcile_queue = asyncio.Queue()
+        self.loop = None
+        self.current_configuration = None
         self.secrets_path = Path().joinpath(SECRETS_KEY).resolve()
+        self.fingerprint_path = Path().joinpath(CONFIGURATION_FINGERPRINT_FILE).resolve()
+        self.cluster_initialization = ClusterInitialization(Path().joinpath(INITDB_STATE_FILE).resolve())
+        self.__logs_task = None
+        self.__logs_stream = None
+        self.__docker_events = None
+
+    async def load_configuration(self) -> None:
+        """
+        Retrieves the configuration of the component over IPC, which has to be done before the reconcile loop runs and
+        the scheduled jobs read the current configuration.
+
+        Args
+        None
+
+        Returns
+        None
+        """
+        self.current_configuration = await self.executor.run(self.config_handler.get_configuration)
+
+    async def run(self):
+        """
+        Runs the reconcile loop until cancelled. The container is (re)created for the current configuration on startup,
+        and whenever the configuration is updated afterwards.
+
+        Args
+        None
+
+        Returns
+        None
+        """
+        self.loop = asyncio.get_running_loop()
+        await self.executor.run(self.subscribe_to_configuration_updates)
+        self.reconcile_queue.put_nowait((ReconcileReason.STARTUP, None))
+        events_task = asyncio.create_task(self._watch_docker_events())
+        try:
+            while True:
+                batch = [await self.reconcile_queue.get()]
+                while not self.reconcile_queue.empty():
+                    batch.append(self.reconcile_queue.get_nowait())
+                await self.reconcile(batch)
+        finally:
+            events_task.cancel()
+            self._stop_following_logs()
+            if self.__docker_events:
+                # Unblocks the stream executor thread waiting for the next event
+                self.__docker_events.close()
 
     def subscribe_to_configuration_updates(self):
         """
         Subscribes to the component configuration updates over IPC using callbacks for the stream events.
-        Any new configuration update to the component triggers on_stream_event -> on_configuration_update_event callback.
+        Any new configuration update to the component triggers on_stream_event -> on_configuration_update_event callback,
+        which runs on an IPC thread and hands the event over to the reconcile queue.
 
         Args
         None
@@ -64,55 +165,160 @@ class ContainerManagement:
     def _on_configuration_update_event(self, events: ConfigurationUpdateEvents):
         if not events.configuration_update_event:
             return
-        with self.lock:
-            component_configuration = self.config_handler.get_configuration()
-            if self.current_configuration != component_configuration:
-                self.current_configuration = component_configuration
-                self.manage_postgresql_container(component_configuration)
+        self.loop.call_soon_threadsafe(self.reconcile_queue.put_nowait, (ReconcileReason.CONFIGURATION_UPDATE, None))
+
+    async def reconcile(self, batch: list):
+        """
+        Handles a batch of reconcile events. Configuration updates of a batch are coalesced, so that the configuration is
+        only retrieved and applied once.
+
+        Args
+            batch(list): (ReconcileReason, event) tuples taken from the reconcile queue.
+
+        Returns
+            None
+        """
+        reasons = {reason for reason, _ in batch}
+        if ReconcileReason.STARTUP in reasons:
+            # Failing to start the database on startup fails the component, so that Greengrass restarts it
+            await self._apply_configuration(force=True)
+        elif ReconcileReason.CONFIGURATION_UPDATE in reasons:
+            try:
+                await self._apply_configuration(force=False)
+            except Exception:
+                logging.exception("Exception occurred while applying the configuration, keeping the current container")
+        for reason, event in batch:
+            if reason == ReconcileReason.CONTAINER_EVENT:
+                self._on_container_event(event)
+        # A new data volume is recorded as initialized by the first reconcile after initdb ran, even after a restart
+        await self.executor.run(self.cluster_initialization.confirm)
+
+    async def _apply_configuration(self, force: bool):
+        component_configuration = await self.executor.run(self.config_handler.get_configuration)
+        snapshot = await self.executor.run(component_configuration.snapshot)
+        if force:
+            recreate = not await self._adopt_running_container(component_configuration)
+            changed = True
+        else:
+            changes = self.current_configuration.snapshot().diff(snapshot)
+            if changes:
+                logging.info("Configuration changed: %s", ", ".join(change.field for change in changes))
+            recreate = any(change.requires_new_container for change in changes)
+            changed = bool(changes)
+            changed_fields = {change.field for change in changes}
+            if "initdb" in changed_fields and "host_volume" not in changed_fields:
+                logging.warning("The Initdb configuration only applies when a new data volume is initialized")
+        if recreate:
+            await self.manage_postgresql_container(component_configuration)
+        # Settings that do not affect the container (e.g. maintenance) are picked up by the scheduled jobs directly
+        self.current_configuration = component_configuration
+        if changed:
+            await self.executor.run(self._write_fingerprint_to_file, snapshot)
+
+    async def _adopt_running_container(self, configuration: ComponentConfiguration) -> bool:
+        """
+        Keeps the running container on startup if it was created for the same container settings, i.e. the container
+        fingerprint persisted by the last successful apply matches the container fingerprint of the configuration.
+
+        Args
+            configuration(ComponentConfiguration): Configuration of the component on startup.
+
+        Returns
+            True if the running container is kept, False if it has to be (re)created
+        """
+        if await self.executor.run(self._read_fingerprint_from_file) != configuration.snapshot().container_fingerprint:
+            return False
+        await self._set_container(configuration)
+        if not self.postgresql_container or self.postgresql_container.status != "running":
+            return False
+        logging.info(
+            "Keeping the running docker container: %s as the configuration did not change",
+            configuration.get_container_name(),
+        )
+        self._follow_container_logs()
+        return True
+
+    async def _watch_docker_events(self):
+        try:
+            self.__docker_events = await self.executor.run(
+                self.docker_client.events, decode=True, filters={"type": "container"}
+            )
+            async for event in self.stream_executor.iterate(self.__docker_events):
+                self.reconcile_queue.put_nowait((ReconcileReason.CONTAINER_EVENT, event))
+        except Exception:
+            logging.exception("Exception occurred while watching the docker container events")
+
+    def _on_container_event(self, event: dict):
+        if not self.postgresql_container or event.get("id") != self.postgresql_container.id:
+            return
+        action = event.get("Action")
+        if action == "start" and (not self.__logs_task or self.__logs_task.done()):
+            # The log stream ends when the container stops, follow it again after a restart outside of the component
+            self._follow_container_logs()
+        elif action == "die":
+            logging.warning(
+                "The docker container: {}-{} exited with code {}".format(
+                    self.postgresql_container.name,
+                    self.postgresql_container.id,
+                    event.get("Actor", {}).get("Attributes", {}).get("exitCode"),
+                )
+            )
+        elif action == "destroy":
+            logging.warning("The docker container: {} was removed".format(self.postgresql_container.id))
+            self.postgresql_container = None
 
-    def _set_container(self, configuration: ComponentConfiguration):
+    async def _set_container(self, configuration: ComponentConfiguration):
         if not self.postgresql_container:
             try:
-                self.postgresql_container = self.docker_client.containers.get(configuration.get_container_name())
+                self.postgresql_container = await self.executor.run(
+                    self.docker_client.containers.get, configuration.get_container_name()
+                )
             except docker.errors.NotFound as not_found:
                 logging.debug("Exception while getting the container: ", not_found.explanation)
             except Exception as exception:
                 logging.exception(exception, exc_info=True)
 
-    def manage_postgresql_container(self, configuration: ComponentConfiguration):
-        self._set_container(configuration)
+    async def manage_postgresql_container(self, configuration: ComponentConfiguration):
+        # Refuse invalid configuration files while the current container is still running
+        await self.executor.run(validate_configuration_files, configuration)
+        # Get the image before stopping the running container so that a pull does not add to the downtime
+        self.postgresql_image = await self.executor.run(
+            self.image_management.prepare_image, configuration, timeout=IMAGE_PREPARE_TIMEOUT_SECONDS
+        )
+        await self._set_container(configuration)
         logging.info("Creating a new docker container: %s as the configuration changed", configuration.get_container_name())
-        self._recreate_container(configuration)
+        await self._recreate_container(configuration)
 
-    def _recreate_container(self, configuration):
+    async def _recreate_container(self, configuration):
         if self.postgresql_container:
-            self._stop_container()
-            self._remove_container()
-        self._run_container(configuration)
+            await self._stop_container()
+            await self._remove_container()
+        await self._run_container(configuration)
 
-    def _stop_container(self):
+    async def _stop_container(self):
         if not self.postgresql_container:
             return
         logging.info(
             "Stopping the docker container : {}-{}".format(self.postgresql_container.name, self.postgresql_container.id)
         )
         try:
-            self.postgresql_container.stop()
+            await self.executor.run(self.postgresql_container.stop)
         except docker.errors.NotFound as e:
             logging.debug(
                 "Could not stop the container: {}-{} as it does not exist : {}".format(
                     self.postgresql_container.name, self.postgresql_container.id, e.explanation
                 )
             )
+        self._stop_following_logs()
 
-    def _remove_container(self):
+    async def _remove_container(self):
         if not self.postgresql_container:
             return
         logging.info(
             "Removing the docker container : {}-{}".format(self.postgresql_container.name, self.postgresql_container.id)
         )
         try:
-            self.postgresql_container.remove()
+            await self.executor.run(self.postgresql_container.remove)
         except docker.errors.NotFound as e:
             logging.debug(
                 "Could not remove the container: {}-{}  as it does not exist : {}".format(
@@ -133,28 +339,37 @@ class ContainerManagement:
             volumes.append(f"{file_abs_path}:{CUSTOM_FILES}/{conf_file}")
         return volumes
 
-    def _run_container(self, config: ComponentConfiguration):
+    async def _run_container(self, config: ComponentConfiguration):
         db_username, db_password = config.get_db_credentials()
-        self._write_secrets_to_file(db_username, db_password)
+        await self.executor.run(self._write_secrets_to_file, db_username, db_password)
         postgres_env = {
             POSTGRES_USERNAME_FILE_KEY: f"{CUSTOM_FILES}/{SECRETS_KEY}/{POSTGRES_USERNAME_FILE_KEY}",
             POSTGRES_PASSWORD_FILE_KEY: f"{CUSTOM_FILES}/{SECRETS_KEY}/{POSTGRES_PASSWORD_FILE_KEY}",
             POSTGRES_DB_KEY: DEFAULT_DB_NAME,
+            **get_initdb_environment(config.get_initdb_config()),
         }
+        volumes = self._get_volumes(config)
+        new_cluster = await self.executor.run(self.cluster_initialization.is_new_cluster, config)
+        if new_cluster:
+            volumes.extend(get_init_script_volumes(config.get_initdb_config()))
 
+        config_command = await self.executor.run(self._create_config_command, config)
         postgres_ports = {DEFAULT_CONTAINER_PORT: config.get_host_port()}
         container_name = config.get_container_name()
         logging.info("Running the docker container : %s", container_name)
 
-        self.postgresql_container = self.docker_client.containers.run(
-            POSTGRES_IMAGE,
-            "{} {}".format(POSTGRES_COMMAND_DO_NOT_CHANGE, self._create_config_command(config)),
+        self.postgresql_container = await self.executor.run(
+            self.docker_client.containers.run,
+            self.postgresql_image,
+            "{} {}".format(POSTGRES_COMMAND_DO_NOT_CHANGE, config_command),
             name=container_name,
             ports=postgres_ports,
             environment=postgres_env,
-            volumes=self._get_volumes(config),
+            volumes=volumes,
             detach=True,
         )
+        if new_cluster:
+            await self.executor.run(self.cluster_initialization.start, config)
         self._follow_container_logs()
 
     def _write_secrets_to_file(self, db_username, db_password):
@@ -171,9 +386,29 @@ class ContainerManagement:
         except Exception as e:
             logging.exception("Exception while writing the secrets files: ", e)
 
+    def _write_fingerprint_to_file(self, snapshot: ConfigurationSnapshot):
+        try:
+            self.fingerprint_path.write_text(snapshot.container_fingerprint)
+        except Exception:
+            logging.exception("Exception while writing the configuration fingerprint file")
+
+    def _read_fingerprint_from_file(self):
+        try:
+            return self.fingerprint_path.read_text().strip()
+        except FileNotFoundError:
+            return None
+
     def _create_config_command(self, config):
         command = ""
         server_configuration_files = config.get_pg_config_files()
+        if config.get_query_statistics_config()[QUERY_STATISTICS_ENABLED_KEY]:
+            # The command line overrides postgresql.conf, so the libraries preloaded by a custom file are kept
+            libraries = []
+            if "postgresql.conf" in (server_configuration_files or {}):
+                libraries = get_shared_preload_libraries(Path(server_configuration_files["postgresql.conf"]).read_text())
+            if PG_STAT_STATEMENTS_LIBRARY not in libraries:
+                libraries.append(PG_STAT_STATEMENTS_LIBRARY)
+            command = command + " -c shared_preload_libraries={}".format(shlex.quote(",".join(libraries)))
         if not server_configuration_files:
             return command
         for conf_file in server_configuration_files.keys():
@@ -181,15 +416,25 @@ class ContainerManagement:
         return command
 
     def _follow_container_logs(self):
-        def _follow_logs():
-            logs_from_container = self.postgresql_container.logs(follow=True, stream=True)
-            for log in logs_from_container:
-                logging.info(log.decode())
+        async def _follow_logs(container):
+            try:
+                self.__logs_stream = await self.stream_executor.run(container.logs, follow=True, stream=True)
+                async for log in self.stream_executor.iterate(self.__logs_stream):
+                    logging.info(log.decode())
+            except Exception:
+                logging.exception("Exception occurred while following the docker container logs")
 
         logging.info(
             "Following the docker container: {}-{} logs....".format(
                 self.postgresql_container.name, self.postgresql_container.id
             )
         )
-        logs_thread = Thread(target=_follow_logs)
-        logs_thread.start()
+        self.__logs_task = asyncio.create_task(_follow_logs(self.postgresql_container))
+
+    def _stop_following_logs(self):
+        if self.__logs_task:
+            self.__logs_task.cancel()
+        if self.__logs_stream:
+            # Unblocks the stream executor thread waiting for the next log line
+            self.__logs_stream.close()
+            self.__logs_stream = None
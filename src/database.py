@@ -0,0 +1,153 @@
+import logging
+
+import psycopg2
+
+from src.configuration import ComponentConfiguration
+from src.constants import DATABASE_CONNECT_TIMEOUT_SECONDS, DATABASE_HOST, DEFAULT_DB_NAME
+
+
+class DatabaseClient:
+    """
+    This is used to run SQL statements against the PostgreSQL server managed by the component. The connection is opened
+    lazily on first use and re-opened whenever the connection parameters in the component configuration change.
+    """
+
+    def __init__(self, autocommit: bool = True) -> None:
+        self.__autocommit = autocommit
+        self.__connection = None
+        self.__connection_params = None
+        self.__shut_down = False
+
+    def configure(self, configuration: ComponentConfiguration) -> None:
+        """
+        Updates the connection parameters from the component configuration. An open connection is closed if any of the
+        parameters changed, so that the next statement reconnects with the new parameters.
+
+        Args
+            configuration(ComponentConfiguration): Current configuration of the component.
+
+        Returns
+            None
+        """
+        db_username, db_password = configuration.get_db_credentials()
+        connection_params = {
+            "host": DATABASE_HOST,
+            "port": configuration.get_host_port(),
+            "dbname": DEFAULT_DB_NAME,
+            "user": db_username,
+            "password": db_password,
+            "connect_timeout": DATABASE_CONNECT_TIMEOUT_SECONDS,
+        }
+        if connection_params != self.__connection_params:
+            self.close()
+            self.__connection_params = connection_params
+
+    def get_connection(self):
+        "Returns an open connection to the database, connecting if required"
+        if self.__shut_down:
+            raise Exception("Database client is shut down.")
+        if not self.__connection_params:
+            raise Exception("Database client is not configured. Call configure() before running any statement.")
+        if self.__connection is None or self.__connection.closed:
+            self.__connection = psycopg2.connect(**self.__connection_params)
+            self.__connection.autocommit = self.__autocommit
+        return self.__connection
+
+    def query(self, statement, params=None) -> list:
+        """
+        Runs a statement and returns all the rows of its result.
+
+        Args
+            statement(str | psycopg2.sql.Composable): SQL statement to run.
+            params(tuple | dict): Optional statement parameters.
+
+        Returns
+            List of row tuples
+        """
+        try:
+            with self.get_connection().cursor() as cursor:
+                cursor.execute(statement, params)
+                return cursor.fetchall()
+        except psycopg2.OperationalError:
+            self.close()
+            raise
+
+    def execute(self, statement, params=None) -> None:
+        """
+        Runs a statement that does not return rows.
+
+        Args
+            statement(str | psycopg2.sql.Composable): SQL statement to run.
+            params(tuple | dict): Optional statement parameters.
+
+        Returns
+            None
+        """
+        try:
+            with self.get_connection().cursor() as cursor:
+                cursor.execute(statement, params)
+        except psycopg2.OperationalError:
+            self.close()
+            raise
+
+    def copy_to(self, statement, file) -> None:
+        """
+        Runs a COPY ... TO STDOUT statement and writes its output to a file.
+
+        Args
+            statement(str | psycopg2.sql.Composable): COPY statement to run.
+            file(BinaryIO): File object the output is written to.
+
+        Returns
+            None
+        """
+        try:
+            with self.get_connection().cursor() as cursor:
+                cursor.copy_expert(statement, file)
+        except psycopg2.OperationalError:
+            self.close()
+            raise
+
+    def commit(self) -> None:
+        "Commits the current transaction of a client that is not in autocommit mode"
+        try:
+            self.get_connection().commit()
+        except psycopg2.OperationalError:
+            self.close()
+            raise
+
+    def rollback(self) -> None:
+        "Rolls back the current transaction of a client that is not in autocommit mode"
+        try:
+            self.get_connection().rollback()
+        except psycopg2.OperationalError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        "Closes the connection to the database if one is open"
+        if self.__connection is None:
+            return
+        try:
+            self.__connection.close()
+        except psycopg2.Error:
+            logging.debug("Exception while closing the database connection", exc_info=True)
+        self.__connection = None
+
+    def shutdown(self) -> None:
+        """
+        Cancels the statement running on the connection and refuses any further statement, so that a scheduled job
+        ends without waiting for e.g. a VACUUM or a COPY to complete. This is safe to call from another thread than the
+        one running the statement.
+
+        Returns
+            None
+        """
+        self.__shut_down = True
+        connection = self.__connection
+        if connection is None or connection.closed:
+            return
+        try:
+            connection.cancel()
+        except psycopg2.Error:
+            logging.debug("Exception while cancelling the running database statement", exc_info=True)
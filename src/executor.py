@@ -0,0 +1,63 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BlockingExecutor:
+    """
+    This is used to run blocking calls (Docker, IPC and database calls) from the asyncio event loop on a fixed size
+    thread pool, so that a slow call never stalls the event handling. A call that times out raises asyncio.TimeoutError
+    in the caller, the worker thread finishes the call in the background.
+    """
+
+    def __init__(self, max_workers: int, default_timeout: float, thread_name_prefix: str) -> None:
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.__default_timeout = default_timeout
+
+    async def run(self, func, *args, timeout: float = None, **kwargs):
+        """
+        Runs a blocking function on the thread pool.
+
+        Args
+            func(Callable): Blocking function to run.
+            timeout(float): Seconds to wait for the result, defaults to the executor's default timeout. None or 0
+                waits without a timeout when the executor has no default timeout.
+            *args, **kwargs: Arguments of the function.
+
+        Returns
+            Return value of the function
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.__pool, functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout or self.__default_timeout)
+
+    async def iterate(self, iterable):
+        """
+        Iterates over a blocking iterable (e.g. a Docker log or event stream), fetching every item on the thread pool.
+        A worker thread is busy for as long as it waits for the next item.
+
+        Args
+            iterable(Iterable): Blocking iterable.
+
+        Returns
+            Async iterator over the items
+        """
+        loop = asyncio.get_running_loop()
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            item = await loop.run_in_executor(self.__pool, next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def shutdown(self) -> None:
+        """
+        Stops the thread pool without waiting for the running calls. The running calls are not interrupted, so the
+        process exits once they return; the callers cancel their long running calls, e.g. the database statements,
+        before shutting down the executor.
+
+        Returns
+            None
+        """
+        self.__pool.shutdown(wait=False, cancel_futures=True)
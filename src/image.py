@@ -0,0 +1,152 @@
+import json
+import logging
+import tarfile
+from pathlib import Path
+
+import docker.errors
+from docker.utils import parse_repository_tag
+
+from src.configuration import ComponentConfiguration, get_file_digest
+from src.constants import (
+    IMAGE_ARCHIVE_DIGEST_KEY,
+    IMAGE_ARCHIVE_MANIFEST_FILE,
+    IMAGE_ARCHIVE_PATH_KEY,
+    IMAGE_DIGEST_KEY,
+    IMAGE_NAME_KEY,
+)
+
+
+def get_image_reference(image_config: dict) -> str:
+    """
+    Returns the reference used to pull and run the image. Images pinned by digest are referenced as repository@digest,
+    the tag of the image name is ignored in that case.
+
+    Args
+        image_config(dict): Image configuration of the component.
+
+    Returns
+        Image reference
+    """
+    digest = image_config[IMAGE_DIGEST_KEY]
+    if not digest:
+        return image_config[IMAGE_NAME_KEY]
+    repository, _ = parse_repository_tag(image_config[IMAGE_NAME_KEY])
+    return f"{repository}@{digest}"
+
+
+def get_archive_image_id(archive_path: Path, name: str) -> str:
+    """
+    Returns the id of the image tagged with the name in an image archive created with docker save, as recorded in the
+    manifest of the archive.
+
+    Args
+        archive_path(Path): Path of the image archive.
+        name(str): Name of the image, the tag defaults to latest.
+
+    Returns
+        Image id
+    """
+    repository, tag = parse_repository_tag(name)
+    repo_tag = f"{repository}:{tag or 'latest'}"
+    with tarfile.open(archive_path) as archive:
+        try:
+            manifest = json.load(archive.extractfile(IMAGE_ARCHIVE_MANIFEST_FILE))
+        except KeyError:
+            raise Exception(f"Invalid image archive. {archive_path} does not contain {IMAGE_ARCHIVE_MANIFEST_FILE}.")
+    for entry in manifest:
+        if repo_tag in (entry.get("RepoTags") or []):
+            # The image id is the digest of the image configuration, stored as <hex>.json or blobs/sha256/<hex>
+            return "sha256:" + Path(entry["Config"]).stem
+    raise Exception(f"The image archive {archive_path} does not contain the image {name}.")
+
+
+class ImageManagement:
+    """
+    This is used to make the PostgreSQL image available locally before any container is stopped, so that the database
+    downtime of a container recreation does not include an image pull. The image is taken from the local image store,
+    loaded from an image archive (e.g. shipped as a Greengrass artifact for air-gapped devices) or pulled from the
+    registry, in that order.
+    """
+
+    def __init__(self, docker_client) -> None:
+        self.docker_client = docker_client
+
+    def prepare_image(self, configuration: ComponentConfiguration) -> str:
+        """
+        Makes the configured image available locally.
+
+        Args
+            configuration(ComponentConfiguration): Configuration of the component.
+
+        Returns
+            Reference of the image to run the container with
+        """
+        image_config = configuration.get_image_config()
+        if image_config[IMAGE_ARCHIVE_PATH_KEY]:
+            return self._load_archive(image_config)
+
+        reference = get_image_reference(image_config)
+        if self._has_local_image(reference):
+            return reference
+        logging.info("Pulling the docker image: %s", reference)
+        repository, tag = parse_repository_tag(reference)
+        self.docker_client.images.pull(repository, tag=tag or "latest")
+        return reference
+
+    def _has_local_image(self, reference: str) -> bool:
+        try:
+            self.docker_client.images.get(reference)
+        except docker.errors.ImageNotFound:
+            return False
+        logging.debug("Using the local docker image: %s", reference)
+        return True
+
+    def _get_local_image_id(self, reference: str):
+        try:
+            return self.docker_client.images.get(reference).id
+        except docker.errors.ImageNotFound:
+            return None
+
+    def _load_archive(self, image_config: dict) -> str:
+        """
+        Loads the image from the image archive, unless the local image of the configured name already is the image of
+        the archive. Loaded images have no repository digest, so the archive digest is verified instead, and the image
+        is only used when its id matches the id recorded in the archive for the configured name.
+
+        Args
+            image_config(dict): Image configuration of the component.
+
+        Returns
+            Name of the image to run the container with
+        """
+        archive_path = Path(image_config[IMAGE_ARCHIVE_PATH_KEY]).absolute()
+        if image_config[IMAGE_DIGEST_KEY]:
+            raise Exception(
+                "The image digest cannot be verified for an image loaded from an image archive. Please remove the Digest,"
+                f" the archive is verified with the ArchiveDigest of {archive_path}."
+            )
+        expected_digest = image_config[IMAGE_ARCHIVE_DIGEST_KEY]
+        if not expected_digest:
+            raise Exception(
+                f"Missing image archive digest. Please provide the sha256 digest of {archive_path} to load the image."
+            )
+        if not expected_digest.startswith("sha256:"):
+            expected_digest = f"sha256:{expected_digest}"
+        archive_digest = get_file_digest(archive_path)
+        if archive_digest != expected_digest:
+            raise Exception(
+                f"Invalid image archive. The digest of {archive_path} is {archive_digest}, expected {expected_digest}."
+            )
+
+        name = image_config[IMAGE_NAME_KEY]
+        image_id = get_archive_image_id(archive_path, name)
+        if self._get_local_image_id(name) == image_id:
+            logging.debug("Using the local docker image: %s", name)
+            return name
+        logging.info("Loading the docker image archive: %s", archive_path)
+        with open(archive_path, "rb") as archive:
+            self.docker_client.images.load(archive)
+        local_image_id = self._get_local_image_id(name)
+        if local_image_id != image_id:
+            raise Exception(f"The loaded image {name} has the id {local_image_id}, expected {image_id} from {archive_path}.")
+        return name
@@ -0,0 +1,215 @@
+import json
+import logging
+from pathlib import Path
+
+from src.configuration import ComponentConfiguration, get_file_digest
+from src.constants import (
+    DEFAULT_INITDB_CONFIG,
+    INIT_SCRIPTS_CONTAINER_PATH,
+    INITDB_AUTH_METHOD_KEY,
+    INITDB_DATA_CHECKSUMS_KEY,
+    INITDB_ENCODING_KEY,
+    INITDB_LOCALE_KEY,
+    INITDB_SCRIPTS_KEY,
+    INITDB_STATE_PENDING_KEY,
+    INITDB_WAL_SEGMENT_SIZE_KEY,
+    PG_VERSION_FILE,
+    POSTGRES_HOST_AUTH_METHOD_KEY,
+    POSTGRES_INITDB_ARGS_KEY,
+)
+
+
+def get_initdb_args(initdb_config: dict) -> str:
+    """
+    Builds the initdb arguments passed to the image entrypoint. Settings left at their default are not passed, so that
+    initdb uses its own defaults.
+
+    Args
+        initdb_config(dict): Initdb configuration of the component.
+
+    Returns
+        initdb arguments, empty if every setting is left at its default
+    """
+    args = []
+    if initdb_config[INITDB_WAL_SEGMENT_SIZE_KEY] != DEFAULT_INITDB_CONFIG[INITDB_WAL_SEGMENT_SIZE_KEY]:
+        args.append("--wal-segsize={}".format(initdb_config[INITDB_WAL_SEGMENT_SIZE_KEY]))
+    if initdb_config[INITDB_DATA_CHECKSUMS_KEY]:
+        args.append("--data-checksums")
+    if initdb_config[INITDB_LOCALE_KEY]:
+        args.append("--locale={}".format(initdb_config[INITDB_LOCALE_KEY]))
+    if initdb_config[INITDB_ENCODING_KEY]:
+        args.append("--encoding={}".format(initdb_config[INITDB_ENCODING_KEY]))
+    return " ".join(args)
+
+
+def get_initdb_environment(initdb_config: dict) -> dict:
+    """
+    Returns the environment variables used by the image entrypoint to initialize a new cluster.
+
+    Args
+        initdb_config(dict): Initdb configuration of the component.
+
+    Returns
+        Environment variables, empty if every setting is left at its default
+    """
+    environment = {}
+    initdb_args = get_initdb_args(initdb_config)
+    if initdb_args:
+        environment[POSTGRES_INITDB_ARGS_KEY] = initdb_args
+    if initdb_config[INITDB_AUTH_METHOD_KEY]:
+        environment[POSTGRES_HOST_AUTH_METHOD_KEY] = initdb_config[INITDB_AUTH_METHOD_KEY]
+    return environment
+
+
+def is_data_volume_empty(host_volume: Path) -> bool:
+    """
+    Checks whether the data volume still has to be initialized. The container changes the owner of the data directory to
+    the postgres user on initialization, so a directory that can not be read is initialized.
+
+    Args
+        host_volume(Path): Host directory mounted as the data directory.
+
+    Returns
+        True if the directory does not exist or is empty
+    """
+    try:
+        return not any(Path(host_volume).iterdir())
+    except FileNotFoundError:
+        return True
+    except PermissionError:
+        return False
+
+
+def is_cluster_initialized(host_volume: Path) -> bool:
+    """
+    Checks whether initdb created a cluster in the data volume. As for is_data_volume_empty, a directory that can not be
+    read is initialized.
+
+    Args
+        host_volume(Path): Host directory mounted as the data directory.
+
+    Returns
+        True if the directory contains the PG_VERSION file of a cluster
+    """
+    try:
+        return Path(host_volume).joinpath(PG_VERSION_FILE).is_file()
+    except PermissionError:
+        return True
+
+
+def get_init_script_volumes(initdb_config: dict) -> list:
+    """
+    Returns the volumes mounting the init scripts read-only into the container. The entrypoint runs the scripts sorted
+    by name, so the file names are prefixed with their index to keep the configured order.
+
+    Args
+        initdb_config(dict): Initdb configuration of the component.
+
+    Returns
+        Volumes of the init scripts
+    """
+    return [
+        f"{script_path}:{INIT_SCRIPTS_CONTAINER_PATH}/{index:02d}-{script_path.name}:ro"
+        for index, script_path in enumerate(initdb_config[INITDB_SCRIPTS_KEY])
+    ]
+
+
+class ClusterInitialization:
+    """
+    This is used to run the init scripts only when a new cluster is initialized. The image entrypoint runs the scripts
+    mounted to /docker-entrypoint-initdb.d whenever the data directory is empty, so the scripts are only mounted for an
+    empty data volume. The data volumes are recorded in a state file together with the initdb arguments and the init
+    scripts used. A data volume is recorded as pending when its container is created, and as initialized once initdb
+    created the PG_VERSION file. The pending volumes are kept in the state file, so that a restart of the component
+    does not lose them.
+    """
+
+    def __init__(self, state_path: Path) -> None:
+        self.state_path = state_path
+
+    def is_new_cluster(self, configuration: ComponentConfiguration) -> bool:
+        """
+        Checks whether the container created for the configuration initializes a new cluster.
+
+        Args
+            configuration(ComponentConfiguration): Configuration the container is created for.
+
+        Returns
+            True if the data volume is empty
+        """
+        self.confirm()
+        host_volume = str(configuration.get_host_volume())
+        recorded = self._read_state().get(host_volume)
+        if recorded is not None and recorded.get(INITDB_STATE_PENDING_KEY):
+            recorded = None
+        if is_data_volume_empty(host_volume):
+            if recorded is not None:
+                logging.warning(
+                    "The data volume: %s was initialized before but is empty, initializing a new cluster", host_volume
+                )
+            return True
+        if recorded is not None and recorded[POSTGRES_INITDB_ARGS_KEY] != get_initdb_args(configuration.get_initdb_config()):
+            logging.warning(
+                "The data volume: %s was initialized with the initdb arguments: '%s', the Initdb configuration only"
+                " applies to new data volumes",
+                host_volume,
+                recorded[POSTGRES_INITDB_ARGS_KEY],
+            )
+        return False
+
+    def start(self, configuration: ComponentConfiguration) -> None:
+        """
+        Records the data volume of the configuration as pending, i.e. being initialized by the container.
+
+        Args
+            configuration(ComponentConfiguration): Configuration the container was created for.
+
+        Returns
+            None
+        """
+        initdb_config = configuration.get_initdb_config()
+        try:
+            state = self._read_state()
+            state[str(configuration.get_host_volume())] = {
+                POSTGRES_INITDB_ARGS_KEY: get_initdb_args(initdb_config),
+                INITDB_SCRIPTS_KEY: {str(path): get_file_digest(path) for path in initdb_config[INITDB_SCRIPTS_KEY]},
+                INITDB_STATE_PENDING_KEY: True,
+            }
+            self._write_state(state)
+        except Exception:
+            logging.exception("Exception while writing the cluster initialization state file")
+
+    def confirm(self) -> None:
+        """
+        Records the pending data volumes whose initialization is confirmed as initialized. Called on every reconcile.
+
+        Args
+            None
+
+        Returns
+            None
+        """
+        try:
+            state = self._read_state()
+            confirmed = [
+                host_volume
+                for host_volume, recorded in state.items()
+                if recorded.get(INITDB_STATE_PENDING_KEY) and is_cluster_initialized(host_volume)
+            ]
+            if not confirmed:
+                return
+            for host_volume in confirmed:
+                del state[host_volume][INITDB_STATE_PENDING_KEY]
+                logging.info("Recorded the data volume: %s as initialized", host_volume)
+            self._write_state(state)
+        except Exception:
+            logging.exception("Exception while writing the cluster initialization state file")
+
+    def _read_state(self) -> dict:
+        try:
+            return json.loads(self.state_path.read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self, state: dict) -> None:
+        self.state_path.write_text(json.dumps(state, indent=2))
@@ -0,0 +1,210 @@
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple
+
+import docker
+from psycopg2 import sql
+
+from src.configuration import ComponentConfiguration
+from src.constants import (
+    MAINTENANCE_BLOAT_RATIO_KEY,
+    MAINTENANCE_DEAD_TUPLE_RATIO_KEY,
+    MAINTENANCE_ENABLED_KEY,
+    MAINTENANCE_HISTORY_SIZE,
+    MAINTENANCE_MAX_ACTIVE_BACKENDS_KEY,
+    MAINTENANCE_MAX_CPU_PERCENT_KEY,
+    MAINTENANCE_MAX_JOBS_KEY,
+    MAINTENANCE_MIN_BLOAT_RELATION_BYTES,
+    MAINTENANCE_MIN_DEAD_TUPLES_KEY,
+    MAINTENANCE_REINDEX_KEY,
+    MAINTENANCE_WINDOWS_KEY,
+)
+from src.container import get_container_cpu_percent
+from src.database import DatabaseClient
+
+# Index tuple header plus its 4 byte line pointer.
+INDEX_TUPLE_OVERHEAD_BYTES = 12
+BTREE_DEFAULT_FILLFACTOR = 0.9
+
+TABLE_STATISTICS_QUERY = """
+SELECT s.schemaname, s.relname, s.n_live_tup, s.n_dead_tup
+FROM pg_stat_user_tables s
+"""
+
+# Expression indexes are skipped, the width of their keys is not in the column statistics.
+INDEX_STATISTICS_QUERY = """
+SELECT s.schemaname, s.indexrelname, pg_relation_size(s.indexrelid), t.reltuples, COALESCE(SUM(p.avg_width), 0)
+FROM pg_stat_user_indexes s
+JOIN pg_index i ON i.indexrelid = s.indexrelid
+JOIN pg_class t ON t.oid = s.relid
+JOIN pg_class ic ON ic.oid = s.indexrelid
+JOIN pg_am am ON am.oid = ic.relam
+JOIN pg_attribute a ON a.attrelid = s.relid AND a.attnum = ANY(i.indkey)
+LEFT JOIN pg_stats p ON p.schemaname = s.schemaname AND p.tablename = s.relname AND p.attname = a.attname
+WHERE am.amname = 'btree' AND i.indisvalid AND i.indexprs IS NULL
+GROUP BY s.schemaname, s.indexrelname, s.indexrelid, t.reltuples
+"""
+
+ACTIVE_BACKENDS_QUERY = """
+SELECT count(*) FROM pg_stat_activity
+WHERE state = 'active' AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+"""
+
+
+class MaintenanceJobResult(NamedTuple):
+    operation: str
+    relation: str
+    started_at: float
+    duration_seconds: float
+    succeeded: bool
+
+
+def estimate_bloat_ratio(tuples: float, tuple_bytes: float, relation_bytes: int, fillfactor: float = 1.0) -> float:
+    """
+    Estimates the fraction of a relation that is not used by live tuples, based on the planner statistics.
+
+    Args
+        tuples(float): Number of live tuples in the relation.
+        tuple_bytes(float): Average size of a tuple including its overhead.
+        relation_bytes(int): Size of the relation on disk.
+        fillfactor(float): Fraction of each page that is expected to be filled.
+
+    Returns
+        Bloat ratio between 0 and 1, or None if there is not enough data for an estimate
+    """
+    if relation_bytes < MAINTENANCE_MIN_BLOAT_RELATION_BYTES or tuples <= 0 or tuple_bytes <= 0:
+        return None
+    expected_bytes = tuples * tuple_bytes / fillfactor
+    return max(0.0, 1.0 - expected_bytes / relation_bytes)
+
+
+def in_maintenance_window(windows: list, now: datetime = None) -> bool:
+    """
+    Checks if the current local time falls into one of the maintenance windows. Windows are given as "HH:MM-HH:MM"
+    strings and may wrap around midnight, e.g. "23:00-02:00".
+
+    Args
+        windows(list): Maintenance windows.
+        now(datetime): Time to check, defaults to the current local time.
+
+    Returns
+        True if the time is in one of the windows
+    """
+    current = (now or datetime.now()).time()
+    for window in windows:
+        try:
+            start, end = (datetime.strptime(value.strip(), "%H:%M").time() for value in window.split("-"))
+        except ValueError:
+            logging.warning("{} is not a valid maintenance window. Expected format is HH:MM-HH:MM.".format(window))
+            continue
+        if start <= end and start <= current < end:
+            return True
+        if start > end and (current >= start or current < end):
+            return True
+    return False
+
+
+class MaintenanceManager:
+    """
+    This is used to run targeted VACUUM (ANALYZE) jobs on the tables whose dead tuple ratio exceeds the configured
+    threshold, and REINDEX CONCURRENTLY jobs on the indexes whose estimated bloat exceeds it. Jobs only run inside a
+    maintenance window, or outside of it while the number of active backends and the container CPU usage are below the
+    configured limits.
+    """
+
+    def __init__(self, docker_client, database_client: DatabaseClient = None) -> None:
+        self.docker_client = docker_client
+        self.database_client = database_client or DatabaseClient()
+        self.history = deque(maxlen=MAINTENANCE_HISTORY_SIZE)
+
+    def run(self, configuration: ComponentConfiguration) -> None:
+        """
+        Plans and runs the maintenance jobs for the current configuration. Called periodically by the scheduler.
+
+        Args
+            configuration(ComponentConfiguration): Current configuration of the component.
+
+        Returns
+            None
+        """
+        maintenance_config = configuration.get_maintenance_config()
+        if not maintenance_config[MAINTENANCE_ENABLED_KEY]:
+            return
+        self.database_client.configure(configuration)
+        jobs = self._plan_jobs(maintenance_config)
+        if not jobs:
+            logging.debug("No maintenance jobs required")
+            return
+        in_window = in_maintenance_window(maintenance_config[MAINTENANCE_WINDOWS_KEY])
+        for operation, relation, statement in jobs[: maintenance_config[MAINTENANCE_MAX_JOBS_KEY]]:
+            if not in_window and not self._load_below_threshold(configuration, maintenance_config):
+                logging.info("Postponing the maintenance jobs as the database is busy")
+                return
+            self._run_job(operation, relation, statement)
+
+    def _plan_jobs(self, maintenance_config: dict) -> list:
+        """
+        Returns the (operation, relation, statement) jobs to run, the most bloated relations first. A plain VACUUM makes
+        the space of dead tuples reusable but does not shrink the table, so tables are only vacuumed for their dead
+        tuples and the bloat estimate is only used for indexes.
+        """
+        jobs = []
+        for schema, table, live_tuples, dead_tuples in self.database_client.query(TABLE_STATISTICS_QUERY):
+            total_tuples = live_tuples + dead_tuples
+            dead_ratio = dead_tuples / total_tuples if total_tuples else 0.0
+            if (
+                dead_ratio >= maintenance_config[MAINTENANCE_DEAD_TUPLE_RATIO_KEY]
+                and dead_tuples >= maintenance_config[MAINTENANCE_MIN_DEAD_TUPLES_KEY]
+            ):
+                statement = sql.SQL("VACUUM (ANALYZE) {}").format(sql.Identifier(schema, table))
+                jobs.append((dead_ratio, "vacuum", f"{schema}.{table}", statement))
+
+        if maintenance_config[MAINTENANCE_REINDEX_KEY]:
+            for schema, index, index_bytes, tuples, key_width in self.database_client.query(INDEX_STATISTICS_QUERY):
+                bloat_ratio = estimate_bloat_ratio(
+                    tuples, key_width + INDEX_TUPLE_OVERHEAD_BYTES, index_bytes, BTREE_DEFAULT_FILLFACTOR
+                )
+                if bloat_ratio is not None and bloat_ratio >= maintenance_config[MAINTENANCE_BLOAT_RATIO_KEY]:
+                    statement = sql.SQL("REINDEX INDEX CONCURRENTLY {}").format(sql.Identifier(schema, index))
+                    jobs.append((bloat_ratio, "reindex", f"{schema}.{index}", statement))
+
+        jobs.sort(key=lambda job: job[0], reverse=True)
+        return [job[1:] for job in jobs]
+
+    def _load_below_threshold(self, configuration: ComponentConfiguration, maintenance_config: dict) -> bool:
+        active_backends = self.database_client.query(ACTIVE_BACKENDS_QUERY)[0][0]
+        if active_backends > maintenance_config[MAINTENANCE_MAX_ACTIVE_BACKENDS_KEY]:
+            logging.debug("{} active backends exceed the maintenance limit".format(active_backends))
+            return False
+        cpu_percent = self._get_container_cpu_percent(configuration.get_container_name())
+        if cpu_percent is not None and cpu_percent > maintenance_config[MAINTENANCE_MAX_CPU_PERCENT_KEY]:
+            logging.debug("Container CPU usage of {:.1f}% exceeds the maintenance limit".format(cpu_percent))
+            return False
+        return True
+
+    def _get_container_cpu_percent(self, container_name: str) -> float:
+        try:
+            stats = self.docker_client.containers.get(container_name).stats(stream=False)
+        except docker.errors.DockerException:
+            logging.debug("Could not get the stats of the container: %s", container_name, exc_info=True)
+            return None
+        return get_container_cpu_percent(stats)
+
+    def _run_job(self, operation: str, relation: str, statement) -> None:
+        started_at = time.time()
+        start = time.monotonic()
+        succeeded = True
+        try:
+            self.database_client.execute(statement)
+        except Exception:
+            succeeded = False
+            logging.exception("Exception occurred while running {} on {}".format(operation, relation))
+        result = MaintenanceJobResult(operation, relation, started_at, time.monotonic() - start, succeeded)
+        self.history.append(result)
+        logging.info(
+            "Maintenance job {} on {} {} in {:.3f}s".format(
+                operation, relation, "completed" if succeeded else "failed", result.duration_seconds
+            )
+        )
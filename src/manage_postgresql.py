@@ -1,12 +1,26 @@
+import asyncio
 import logging
+import signal
 import sys
-import time
 
 import docker
 from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
 
 from src.configuration_handler import ComponentConfigurationIPCHandler
+from src.constants import (
+    DOCKER_CALL_TIMEOUT_SECONDS,
+    EXECUTOR_MAX_WORKERS,
+    MAINTENANCE_INTERVAL_KEY,
+    PARTITIONING_FIRST_RUN_DELAY_SECONDS,
+    PARTITIONING_INTERVAL_KEY,
+    PROBE_INTERVAL_KEY,
+    QUERY_STATISTICS_INTERVAL_KEY,
+    SCHEDULED_JOB_TIMEOUT_SECONDS,
+    STREAM_EXECUTOR_MAX_WORKERS,
+)
 from src.container import ContainerManagement
+from src.executor import BlockingExecutor
+from src.scheduler import Scheduler
 
 
 def configure_logging():
@@ -15,15 +29,114 @@ def configure_logging():
     logger.addHandler(logging.StreamHandler(sys.stdout))
 
 
-if __name__ == "__main__":
-    configure_logging()
+def add_database_jobs(container_management, scheduler, probe_scheduler, ipc_client, docker_client) -> list:
+    """
+    Adds the scheduled jobs that connect to the database. The jobs need the psycopg2 driver, which is only imported
+    here, so that the container is still managed when the driver is not installed.
+
+    Args
+        container_management(ContainerManagement): Provides the current configuration to the jobs.
+        scheduler(Scheduler): Scheduler of the maintenance, query statistics and partitioning jobs.
+        probe_scheduler(Scheduler): Scheduler of the probe.
+        ipc_client(GreengrassCoreIPCClientV2): Used to publish the reports and alerts.
+        docker_client(DockerClient): Used to read the container stats.
+
+    Returns
+        List of the database clients of the jobs
+    """
+    try:
+        from src.maintenance import MaintenanceManager
+        from src.partitions import PartitionManager
+        from src.probe import SloProbe
+        from src.query_statistics import QueryStatisticsReporter
+    except ModuleNotFoundError as error:
+        if error.name != "psycopg2":
+            raise
+        logging.error(
+            "Maintenance, QueryStatistics, Probe and Partitioning are disabled as the psycopg2 driver is not installed."
+            " Install it with: python3 -m pip install psycopg2-binary"
+        )
+        return []
 
+    maintenance_manager = MaintenanceManager(docker_client)
+    scheduler.add_job(
+        "maintenance",
+        container_management.current_configuration.get_maintenance_config()[MAINTENANCE_INTERVAL_KEY],
+        lambda: maintenance_manager.run(container_management.current_configuration),
+    )
+    query_statistics_reporter = QueryStatisticsReporter(ipc_client)
+    scheduler.add_job(
+        "query_statistics",
+        container_management.current_configuration.get_query_statistics_config()[QUERY_STATISTICS_INTERVAL_KEY],
+        lambda: query_statistics_reporter.run(container_management.current_configuration),
+    )
+    partition_manager = PartitionManager()
+    scheduler.add_job(
+        "partitioning",
+        container_management.current_configuration.get_partitioning_config()[PARTITIONING_INTERVAL_KEY],
+        lambda: partition_manager.run(container_management.current_configuration),
+        # The current partitions are required for inserts, so they are created soon after startup
+        delay_seconds=PARTITIONING_FIRST_RUN_DELAY_SECONDS,
+    )
+    slo_probe = SloProbe(ipc_client, docker_client)
+    probe_scheduler.add_job(
+        "probe",
+        container_management.current_configuration.get_probe_config()[PROBE_INTERVAL_KEY],
+        lambda: slo_probe.run(container_management.current_configuration),
+    )
+    return [
+        maintenance_manager.database_client,
+        query_statistics_reporter.database_client,
+        partition_manager.database_client,
+        slo_probe.database_client,
+    ]
+
+
+async def main():
     ipc_client = GreengrassCoreIPCClientV2()
     docker_client = docker.DockerClient(version="auto")
+    # Fixed thread footprint: short Docker/IPC calls, long lived Docker streams and the scheduled jobs
+    executor = BlockingExecutor(EXECUTOR_MAX_WORKERS, DOCKER_CALL_TIMEOUT_SECONDS, "docker")
+    stream_executor = BlockingExecutor(STREAM_EXECUTOR_MAX_WORKERS, None, "docker-stream")
+    job_executor = BlockingExecutor(1, SCHEDULED_JOB_TIMEOUT_SECONDS, "scheduler")
+    probe_executor = BlockingExecutor(1, SCHEDULED_JOB_TIMEOUT_SECONDS, "probe")
     configuration_handler = ComponentConfigurationIPCHandler(ipc_client)
-    container_management = ContainerManagement(ipc_client, docker_client, configuration_handler)
-    container_management.subscribe_to_configuration_updates()
-    container_management.manage_postgresql_container(configuration_handler.get_configuration())
-    # Keep the main thread alive to listen for component updates
-    while True:
-        time.sleep(5)
+    container_management = ContainerManagement(
+        ipc_client, docker_client, configuration_handler, executor, stream_executor
+    )
+    await container_management.load_configuration()
+
+    scheduler = Scheduler(job_executor)
+    # The probe has its own scheduler, so that its latencies are not delayed by long maintenance jobs
+    probe_scheduler = Scheduler(probe_executor)
+    database_clients = add_database_jobs(container_management, scheduler, probe_scheduler, ipc_client, docker_client)
+
+    main_task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, main_task.cancel)
+
+    tasks = [
+        asyncio.create_task(container_management.run()),
+        asyncio.create_task(scheduler.run()),
+        asyncio.create_task(probe_scheduler.run()),
+    ]
+    try:
+        # Runs until the component is stopped, or fails as soon as the container management fails
+        await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        logging.info("Stopping the component")
+    finally:
+        for task in tasks:
+            task.cancel()
+        # The running statements are cancelled, as the threads of the scheduled jobs are not stopped by the executors
+        for database_client in database_clients:
+            database_client.shutdown()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for blocking_executor in (executor, stream_executor, job_executor, probe_executor):
+            blocking_executor.shutdown()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(main())
@@ -0,0 +1,262 @@
+import gzip
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import psycopg2
+from psycopg2 import sql
+
+from src.configuration import ComponentConfiguration
+from src.constants import (
+    PARTITION_BRIN_PAGES_PER_RANGE_KEY,
+    PARTITION_EXPIRED_ACTION_KEY,
+    PARTITION_EXPORT_DIRECTORY_KEY,
+    PARTITION_INTERVAL_KEY,
+    PARTITION_LOCK_TIMEOUT_MILLISECONDS,
+    PARTITION_PREMAKE_KEY,
+    PARTITION_RETENTION_DAYS_KEY,
+    PARTITION_TABLE_KEY,
+    PARTITION_TIME_COLUMN_KEY,
+    PARTITIONING_ENABLED_KEY,
+    PARTITIONING_TABLES_KEY,
+)
+from src.database import DatabaseClient
+
+# PostgreSQL truncates longer identifiers (NAMEDATALEN - 1).
+MAX_IDENTIFIER_LENGTH = 63
+PARTITION_NAME_FORMATS = {"hour": "%Y%m%d%H", "day": "%Y%m%d", "week": "%Y%m%d", "month": "%Y%m"}
+RANGE_PARTITIONED_QUERY = """
+SELECT p.partstrat = 'r'
+FROM pg_partitioned_table p
+JOIN pg_class c ON c.oid = p.partrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relname = %s
+"""
+PARTITIONS_QUERY = """
+SELECT c.relname
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+JOIN pg_class p ON p.oid = i.inhparent
+JOIN pg_namespace n ON n.oid = p.relnamespace
+WHERE n.nspname = %s AND p.relname = %s
+"""
+TIME_COLUMN_TYPE_QUERY = """
+SELECT format_type(a.atttypid, NULL)
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relname = %s AND a.attname = %s AND a.attnum > 0 AND NOT a.attisdropped
+"""
+LOCK_TIMEOUT_STATEMENT = "SET lock_timeout = %s"
+
+
+def get_partition_start(moment: datetime, interval: str) -> datetime:
+    """
+    Returns the start of the partition interval (in UTC) containing the given moment. Weeks start on Monday.
+
+    Args
+        moment(datetime): Timezone aware moment.
+        interval(str): Partition interval, one of hour, day, week and month.
+
+    Returns
+        Start of the partition
+    """
+    moment = moment.astimezone(timezone.utc)
+    if interval == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        return start - timedelta(days=start.weekday())
+    if interval == "month":
+        return start.replace(day=1)
+    return start
+
+
+def get_next_partition_start(start: datetime, interval: str) -> datetime:
+    "Returns the start of the partition following the partition starting at start"
+    if interval == "hour":
+        return start + timedelta(hours=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    if interval == "month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start + timedelta(days=1)
+
+
+def _get_partition_prefix(table: str, interval: str) -> str:
+    suffix_length = len("_p") + len(datetime(2000, 1, 1).strftime(PARTITION_NAME_FORMATS[interval]))
+    return "{}_p".format(table[: MAX_IDENTIFIER_LENGTH - suffix_length])
+
+
+def get_partition_name(table: str, start: datetime, interval: str) -> str:
+    "Returns the name of the partition of a table starting at start, e.g. telemetry_p20240131 for a daily partition"
+    return _get_partition_prefix(table, interval) + start.strftime(PARTITION_NAME_FORMATS[interval])
+
+
+def parse_partition_start(table: str, partition: str, interval: str) -> datetime:
+    """
+    Returns the start of a partition created by the component from its name.
+
+    Args
+        table(str): Name of the partitioned table, without schema.
+        partition(str): Name of the partition.
+        interval(str): Partition interval of the table.
+
+    Returns
+        Start of the partition in UTC, or None if the partition was not created by the component
+    """
+    match = re.fullmatch(re.escape(_get_partition_prefix(table, interval)) + r"(\d+)", partition)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), PARTITION_NAME_FORMATS[interval]).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def split_table_name(table: str) -> tuple:
+    "Returns the (schema, table) of a table name, the schema defaults to public"
+    schema, _, name = table.rpartition(".")
+    return schema or "public", name
+
+
+class PartitionManager:
+    """
+    This is used to manage range partitioned time series tables, so that expiring old data is a partition drop instead
+    of a table wide DELETE that leaves bloat behind. On every run the partitions for the current and the next intervals
+    are created and get a BRIN index on the time column, and the partitions that ended before the retention period are
+    dropped or detached, after exporting them to a gzip compressed CSV file if an export directory is configured. The
+    partitioned tables themselves are created by the user, e.g. with an init script.
+    """
+
+    def __init__(self, database_client: DatabaseClient = None) -> None:
+        self.database_client = database_client or DatabaseClient()
+
+    def run(self, configuration: ComponentConfiguration, now: datetime = None) -> None:
+        """
+        Creates and expires the partitions of the configured tables. Called periodically by the scheduler.
+
+        Args
+            configuration(ComponentConfiguration): Current configuration of the component.
+            now(datetime): Current time, defaults to now.
+
+        Returns
+            None
+        """
+        partitioning_config = configuration.get_partitioning_config()
+        if not partitioning_config[PARTITIONING_ENABLED_KEY]:
+            return
+        self.database_client.configure(configuration)
+        now = now or datetime.now(timezone.utc)
+        for table_config in partitioning_config[PARTITIONING_TABLES_KEY]:
+            try:
+                self._manage_table(table_config, now)
+            except psycopg2.Error:
+                logging.exception("Exception occurred while managing the partitions of: %s", table_config[PARTITION_TABLE_KEY])
+
+    def _manage_table(self, table_config: dict, now: datetime) -> None:
+        schema, table = split_table_name(table_config[PARTITION_TABLE_KEY])
+        range_partitioned = self.database_client.query(RANGE_PARTITIONED_QUERY, (schema, table))
+        if not range_partitioned or not range_partitioned[0][0]:
+            logging.warning("The table: %s.%s does not exist or is not partitioned by range", schema, table)
+            return
+        interval = table_config[PARTITION_INTERVAL_KEY]
+        time_column = table_config[PARTITION_TIME_COLUMN_KEY]
+        column_type = self.database_client.query(TIME_COLUMN_TYPE_QUERY, (schema, table, time_column))
+        if not column_type:
+            logging.warning("The table: %s.%s does not have the time column: %s", schema, table, time_column)
+            return
+        if column_type[0][0] == "date" and interval == "hour":
+            # Hourly bounds would be truncated to the same date, so the partitions could not be created
+            logging.warning("The table: %s.%s can not be partitioned by hour as %s is a date", schema, table, time_column)
+            return
+        partitions = {row[0] for row in self.database_client.query(PARTITIONS_QUERY, (schema, table))}
+
+        start = get_partition_start(now, interval)
+        for _ in range(table_config[PARTITION_PREMAKE_KEY] + 1):
+            end = get_next_partition_start(start, interval)
+            partition = get_partition_name(table, start, interval)
+            if partition in partitions or self._create_partition(schema, table, partition, start, end):
+                # Idempotent, so that a partition gets its index even if creating it failed on an earlier run
+                self._create_brin_index(schema, partition, table_config)
+            start = end
+
+        retention_days = table_config[PARTITION_RETENTION_DAYS_KEY]
+        if not retention_days:
+            return
+        cutoff = now - timedelta(days=retention_days)
+        for partition in sorted(partitions):
+            partition_start = parse_partition_start(table, partition, interval)
+            if partition_start is not None and get_next_partition_start(partition_start, interval) <= cutoff:
+                self._expire_partition(schema, table, partition, table_config)
+
+    def _create_partition(self, schema: str, table: str, partition: str, start: datetime, end: datetime) -> bool:
+        "Creates the partition of the table for [start, end), returns whether the partition was created"
+        statement = sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(schema, partition), sql.Identifier(schema, table)
+        )
+        try:
+            self.database_client.execute(LOCK_TIMEOUT_STATEMENT, (PARTITION_LOCK_TIMEOUT_MILLISECONDS,))
+            self.database_client.execute(statement, (start.isoformat(), end.isoformat()))
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.Error:
+            logging.exception("Exception occurred while creating the partition: %s.%s", schema, partition)
+            return False
+        logging.info("Created the partition: %s.%s for [%s, %s)", schema, partition, start.isoformat(), end.isoformat())
+        return True
+
+    def _create_brin_index(self, schema: str, partition: str, table_config: dict) -> None:
+        statement = sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING brin ({}) WITH (pages_per_range = {})").format(
+            sql.Identifier(partition[: MAX_IDENTIFIER_LENGTH - len("_brin")] + "_brin"),
+            sql.Identifier(schema, partition),
+            sql.Identifier(table_config[PARTITION_TIME_COLUMN_KEY]),
+            sql.Literal(table_config[PARTITION_BRIN_PAGES_PER_RANGE_KEY]),
+        )
+        try:
+            self.database_client.execute(LOCK_TIMEOUT_STATEMENT, (PARTITION_LOCK_TIMEOUT_MILLISECONDS,))
+            self.database_client.execute(statement)
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.Error:
+            logging.exception("Exception occurred while creating the BRIN index of the partition: %s.%s", schema, partition)
+
+    def _expire_partition(self, schema: str, table: str, partition: str, table_config: dict) -> None:
+        export_directory = table_config[PARTITION_EXPORT_DIRECTORY_KEY]
+        if export_directory and not self._export_partition(schema, partition, Path(export_directory)):
+            return
+        if table_config[PARTITION_EXPIRED_ACTION_KEY] == "detach":
+            statement = sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(schema, table), sql.Identifier(schema, partition)
+            )
+        else:
+            statement = sql.SQL("DROP TABLE {}").format(sql.Identifier(schema, partition))
+        try:
+            self.database_client.execute(LOCK_TIMEOUT_STATEMENT, (PARTITION_LOCK_TIMEOUT_MILLISECONDS,))
+            self.database_client.execute(statement)
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.Error:
+            logging.exception("Exception occurred while expiring the partition: %s.%s", schema, partition)
+            return
+        logging.info("Expired the partition: %s.%s (%s)", schema, partition, table_config[PARTITION_EXPIRED_ACTION_KEY])
+
+    def _export_partition(self, schema: str, partition: str, export_directory: Path) -> bool:
+        "Exports a partition to <schema>.<partition>.csv.gz, returns whether the export succeeded"
+        export_path = export_directory.joinpath(f"{schema}.{partition}.csv.gz")
+        # Written under a temporary name, so that an interrupted export never looks complete
+        temporary_path = export_path.with_name(export_path.name + ".tmp")
+        statement = sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)").format(sql.Identifier(schema, partition))
+        try:
+            export_directory.mkdir(parents=True, exist_ok=True)
+            with gzip.open(temporary_path, "wb") as export_file:
+                self.database_client.copy_to(statement, export_file)
+            temporary_path.replace(export_path)
+        except psycopg2.OperationalError:
+            raise
+        except (OSError, psycopg2.Error):
+            logging.exception("Exception occurred while exporting the partition: %s.%s", schema, partition)
+            return False
+        logging.info("Exported the partition: %s.%s to %s", schema, partition, export_path)
+        return True
@@ -0,0 +1,357 @@
+import logging
+import math
+import time
+
+import docker
+import psycopg2
+import psycopg2.errors
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+from awsiot.greengrasscoreipc.model import JsonMessage, PublishMessage
+
+from src.configuration import ComponentConfiguration
+from src.constants import (
+    PROBE_ALERT_COOLDOWN_KEY,
+    PROBE_ALERT_QUANTILE,
+    PROBE_CANARIES_KEY,
+    PROBE_CANARY_COMMIT,
+    PROBE_CANARY_READ,
+    PROBE_CANARY_WRITE,
+    PROBE_ENABLED_KEY,
+    PROBE_MAX_ALERT_COOLDOWN_SECONDS,
+    PROBE_MAX_WAIT_EVENTS,
+    PROBE_MIN_SAMPLES_KEY,
+    PROBE_RECOVERY_RATIO,
+    PROBE_SLO_KEY,
+    PROBE_STATEMENT_TIMEOUT_KEY,
+    PROBE_TABLE,
+    PROBE_TOPIC_KEY,
+    PROBE_WINDOW_KEY,
+    SKETCH_MAX_BUCKETS,
+    SKETCH_RELATIVE_ACCURACY,
+)
+from src.container import get_container_cpu_percent
+from src.database import DatabaseClient
+
+CREATE_TABLE_STATEMENT = """
+CREATE TABLE IF NOT EXISTS {} (id integer PRIMARY KEY, value bigint NOT NULL, updated_at timestamptz NOT NULL)
+""".format(
+    PROBE_TABLE
+)
+INSERT_ROW_STATEMENT = "INSERT INTO {} VALUES (1, 0, now()) ON CONFLICT (id) DO NOTHING".format(PROBE_TABLE)
+READ_STATEMENT = "SELECT value, updated_at FROM {} WHERE id = 1".format(PROBE_TABLE)
+WRITE_STATEMENT = "UPDATE {} SET value = value + 1, updated_at = now() WHERE id = 1".format(PROBE_TABLE)
+STATEMENT_TIMEOUT_STATEMENT = "SET LOCAL statement_timeout = %s"
+SYNCHRONOUS_COMMIT_STATEMENT = "SET LOCAL synchronous_commit = on"
+WAIT_EVENTS_QUERY = """
+SELECT wait_event_type, wait_event, state, count(*)
+FROM pg_stat_activity
+WHERE pid <> pg_backend_pid() AND wait_event IS NOT NULL AND backend_type = 'client backend'
+GROUP BY wait_event_type, wait_event, state
+ORDER BY count(*) DESC
+LIMIT %s
+"""
+
+
+class LatencySketch:
+    """
+    Streaming quantile sketch with a bounded memory footprint. Values are counted in logarithmic buckets, so that any
+    quantile is returned with the configured relative accuracy. When the number of buckets exceeds the limit the lowest
+    buckets are merged, which only loses accuracy on the lowest quantiles.
+    """
+
+    __slots__ = ("relative_accuracy", "max_buckets", "count", "zero_count", "buckets", "__gamma_log")
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_buckets: int = SKETCH_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.count = 0
+        self.zero_count = 0
+        self.buckets = {}
+        self.__gamma_log = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+
+    def add(self, value: float) -> None:
+        "Adds a non negative value to the sketch"
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.__gamma_log)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self._collapse()
+
+    def merge(self, other: "LatencySketch") -> None:
+        "Adds the values of a sketch created with the same relative accuracy"
+        self.count += other.count
+        self.zero_count += other.zero_count
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self._collapse()
+
+    def quantile(self, quantile: float) -> float:
+        """
+        Returns the estimated value at the given quantile.
+
+        Args
+            quantile(float): Quantile between 0 and 1, e.g. 0.99.
+
+        Returns
+            Estimated value, or None if the sketch is empty
+        """
+        if not self.count:
+            return None
+        rank = quantile * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Middle of the bucket, within the relative accuracy of every value counted in it
+                return 2 * math.exp(index * self.__gamma_log) / (1 + math.exp(self.__gamma_log))
+        return 2 * math.exp(max(self.buckets) * self.__gamma_log) / (1 + math.exp(self.__gamma_log))
+
+    def _collapse(self) -> None:
+        while len(self.buckets) > self.max_buckets:
+            lowest, second = sorted(self.buckets)[:2]
+            self.buckets[second] += self.buckets.pop(lowest)
+
+
+class _AlertState:
+    __slots__ = ("cooldown", "next_alert")
+
+    def __init__(self, cooldown: float) -> None:
+        self.cooldown = cooldown
+        self.next_alert = 0.0
+
+
+class SloProbe:
+    """
+    This is used to detect a slow database before it fails. The probe keeps one connection to the database and runs the
+    canary transactions (a read, a write, and the commit of the write with synchronous_commit on, i.e. a WAL flush) on
+    every run. Their latencies are kept in constant memory sketches over a sliding window of two periods, and an alert
+    with the container stats and the wait events of the other backends is published when the p99 latency of a canary
+    exceeds its SLO. A breach is repeated with an exponentially growing cooldown while it lasts, and a recovery event
+    is published once the p99 latency is back below the SLO with some margin.
+    """
+
+    def __init__(
+        self, ipc_client: GreengrassCoreIPCClientV2, docker_client, database_client: DatabaseClient = None
+    ) -> None:
+        self.__ipc_client = ipc_client
+        self.docker_client = docker_client
+        self.database_client = database_client or DatabaseClient(autocommit=False)
+        self.__table_ready = False
+        self.__alerts = {}
+        self._reset_window()
+
+    def run(self, configuration: ComponentConfiguration) -> None:
+        """
+        Runs the canary transactions and publishes the alerts. Called periodically by the scheduler.
+
+        Args
+            configuration(ComponentConfiguration): Current configuration of the component.
+
+        Returns
+            None
+        """
+        probe_config = configuration.get_probe_config()
+        if not probe_config[PROBE_ENABLED_KEY]:
+            self.database_client.close()
+            self.__alerts = {}
+            self._reset_window()
+            return
+        self.database_client.configure(configuration)
+        if time.monotonic() - self.__window_started >= probe_config[PROBE_WINDOW_KEY]:
+            self._reset_window(keep_previous=True)
+        self._run_canaries(probe_config[PROBE_CANARIES_KEY], probe_config[PROBE_STATEMENT_TIMEOUT_KEY])
+
+        alerts = self._evaluate(probe_config)
+        if not alerts:
+            return
+        context = {
+            "container": self._get_container_stats(configuration.get_container_name()),
+            "wait_events": self._get_wait_events(),
+        }
+        for alert in alerts:
+            self._publish(probe_config[PROBE_TOPIC_KEY], {**alert, **context})
+
+    def get_latency_sketch(self, canary: str) -> LatencySketch:
+        "Returns the latencies of a canary in milliseconds over the current and the previous window"
+        sketch = LatencySketch()
+        for sketches in (self.__previous_sketches, self.__sketches):
+            if canary in sketches:
+                sketch.merge(sketches[canary])
+        return sketch
+
+    def _reset_window(self, keep_previous: bool = False) -> None:
+        self.__previous_sketches = self.__sketches if keep_previous else {}
+        self.__previous_failures = self.__failures if keep_previous else {}
+        self.__sketches = {}
+        self.__failures = {}
+        self.__window_started = time.monotonic()
+
+    def _run_canaries(self, canaries: list, statement_timeout: int) -> None:
+        if not self.__table_ready:
+            try:
+                self.database_client.execute(CREATE_TABLE_STATEMENT)
+                self.database_client.execute(INSERT_ROW_STATEMENT)
+                self.database_client.commit()
+                self.__table_ready = True
+            except psycopg2.Error:
+                logging.warning("Could not create the probe table", exc_info=True)
+                self._rollback()
+                return
+
+        if PROBE_CANARY_READ in canaries:
+            self._run_transaction(
+                PROBE_CANARY_READ,
+                statement_timeout,
+                [(PROBE_CANARY_READ, self.database_client.query, READ_STATEMENT), (None, self.database_client.rollback)],
+            )
+        if PROBE_CANARY_WRITE in canaries or PROBE_CANARY_COMMIT in canaries:
+            # The commit canary commits the write, the write is rolled back when only the write canary is run
+            write_canary = PROBE_CANARY_WRITE if PROBE_CANARY_WRITE in canaries else None
+            if PROBE_CANARY_COMMIT in canaries:
+                end_step = (PROBE_CANARY_COMMIT, self.database_client.commit)
+            else:
+                end_step = (None, self.database_client.rollback)
+            self._run_transaction(
+                PROBE_CANARY_WRITE,
+                statement_timeout,
+                [
+                    (None, self.database_client.execute, SYNCHRONOUS_COMMIT_STATEMENT),
+                    (write_canary, self.database_client.execute, WRITE_STATEMENT),
+                    end_step,
+                ],
+            )
+
+    def _run_transaction(self, name: str, statement_timeout: int, steps: list) -> None:
+        """
+        Runs the steps of a canary transaction, recording the latency of the steps that belong to a canary. A failure is
+        recorded for the failing step's canary, or the transaction's canary for unmeasured steps, and the transaction is
+        rolled back.
+
+        Args
+            name(str): Canary of the transaction.
+            statement_timeout(int): Statement timeout of the transaction in milliseconds.
+            steps(list): (canary or None, function, *arguments) tuples.
+
+        Returns
+            None
+        """
+        canary = name
+        try:
+            self.database_client.execute(STATEMENT_TIMEOUT_STATEMENT, (statement_timeout,))
+            for step_canary, func, *args in steps:
+                canary = step_canary or name
+                start = time.perf_counter()
+                func(*args)
+                if step_canary:
+                    self._record(step_canary, (time.perf_counter() - start) * 1000)
+        except psycopg2.Error as error:
+            self._record_failure(canary, statement_timeout, error)
+
+    def _record(self, canary: str, latency_ms: float) -> None:
+        self.__sketches.setdefault(canary, LatencySketch()).add(latency_ms)
+
+    def _record_failure(self, canary: str, statement_timeout: int, error: psycopg2.Error) -> None:
+        self.__failures[canary] = self.__failures.get(canary, 0) + 1
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            # A statement cancelled by the timeout took at least as long as the timeout
+            self._record(canary, statement_timeout)
+        else:
+            self.__table_ready = False
+        logging.warning("The %s canary of the probe failed: %s", canary, str(error).strip())
+        self._rollback()
+
+    def _rollback(self) -> None:
+        try:
+            self.database_client.rollback()
+        except psycopg2.Error:
+            logging.debug("Exception while rolling back the probe transaction", exc_info=True)
+
+    def _evaluate(self, probe_config: dict) -> list:
+        "Updates the alert state of every canary and returns the alerts to publish"
+        alerts = []
+        now = time.monotonic()
+        for canary, slo_ms in (probe_config[PROBE_SLO_KEY] or {}).items():
+            sketch = self.get_latency_sketch(canary)
+            if not slo_ms or sketch.count < probe_config[PROBE_MIN_SAMPLES_KEY]:
+                continue
+            latency_ms = sketch.quantile(PROBE_ALERT_QUANTILE)
+            state = self.__alerts.get(canary)
+            if latency_ms > slo_ms:
+                if state is None:
+                    state = self.__alerts[canary] = _AlertState(probe_config[PROBE_ALERT_COOLDOWN_KEY])
+                if now < state.next_alert:
+                    continue
+                state.next_alert = now + state.cooldown
+                state.cooldown = min(state.cooldown * 2, PROBE_MAX_ALERT_COOLDOWN_SECONDS)
+                alerts.append(self._build_alert("slo_breach", canary, slo_ms, sketch, probe_config))
+            elif state is not None and latency_ms <= slo_ms * PROBE_RECOVERY_RATIO:
+                del self.__alerts[canary]
+                alerts.append(self._build_alert("slo_recovered", canary, slo_ms, sketch, probe_config))
+        return alerts
+
+    def _build_alert(self, event: str, canary: str, slo_ms: float, sketch: LatencySketch, probe_config: dict) -> dict:
+        return {
+            "timestamp": int(time.time()),
+            "event": event,
+            "canary": canary,
+            "slo_ms": slo_ms,
+            "p99_ms": round(sketch.quantile(PROBE_ALERT_QUANTILE), 3),
+            "p50_ms": round(sketch.quantile(0.5), 3),
+            "samples": sketch.count,
+            "failures": self.__previous_failures.get(canary, 0) + self.__failures.get(canary, 0),
+            "window_seconds": probe_config[PROBE_WINDOW_KEY],
+        }
+
+    def _get_container_stats(self, container_name: str) -> dict:
+        try:
+            stats = self.docker_client.containers.get(container_name).stats(stream=False)
+        except docker.errors.DockerException:
+            logging.debug("Could not get the stats of the container: %s", container_name, exc_info=True)
+            return {}
+        memory_stats = stats.get("memory_stats", {})
+        io_bytes = {"read": 0, "write": 0}
+        for entry in stats.get("blkio_stats", {}).get("io_service_bytes_recursive") or []:
+            operation = entry.get("op", "").lower()
+            if operation in io_bytes:
+                io_bytes[operation] += entry.get("value", 0)
+        cpu_percent = get_container_cpu_percent(stats)
+        return {
+            "cpu_percent": round(cpu_percent, 1) if cpu_percent is not None else None,
+            "memory_usage_bytes": memory_stats.get("usage"),
+            "memory_limit_bytes": memory_stats.get("limit"),
+            "io_read_bytes": io_bytes["read"],
+            "io_write_bytes": io_bytes["write"],
+            "pids": stats.get("pids_stats", {}).get("current"),
+        }
+
+    def _get_wait_events(self) -> list:
+        try:
+            rows = self.database_client.query(WAIT_EVENTS_QUERY, (PROBE_MAX_WAIT_EVENTS,))
+            self.database_client.rollback()
+        except psycopg2.Error:
+            logging.debug("Could not get the wait events", exc_info=True)
+            self._rollback()
+            return []
+        return [
+            {"wait_event_type": wait_event_type, "wait_event": wait_event, "state": state, "count": count}
+            for wait_event_type, wait_event, state, count in rows
+        ]
+
+    def _publish(self, topic: str, alert: dict) -> None:
+        logging.warning(
+            "Probe %s: p99 latency of the %s canary is %.1f ms (SLO %s ms)",
+            alert["event"],
+            alert["canary"],
+            alert["p99_ms"],
+            alert["slo_ms"],
+        )
+        try:
+            self.__ipc_client.publish_to_topic(
+                topic=topic, publish_message=PublishMessage(json_message=JsonMessage(message=alert))
+            )
+        except Exception:
+            logging.exception("Exception occurred while publishing the probe alert to the topic: %s", topic)
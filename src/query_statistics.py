@@ -0,0 +1,159 @@
+import logging
+import time
+
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+from awsiot.greengrasscoreipc.model import JsonMessage, PublishMessage
+
+from src.configuration import ComponentConfiguration
+from src.constants import (
+    PG_STAT_STATEMENTS_LIBRARY,
+    QUERY_STATISTICS_ENABLED_KEY,
+    QUERY_STATISTICS_MAX_QUERY_LENGTH_KEY,
+    QUERY_STATISTICS_RESET_INTERVAL_KEY,
+    QUERY_STATISTICS_TOP_N_KEY,
+    QUERY_STATISTICS_TOPIC_KEY,
+)
+from src.database import DatabaseClient
+
+CREATE_EXTENSION_STATEMENT = "CREATE EXTENSION IF NOT EXISTS {}".format(PG_STAT_STATEMENTS_LIBRARY)
+RESET_STATEMENT = "SELECT pg_stat_statements_reset()"
+SAMPLE_QUERY = """
+SELECT s.userid, s.dbid, s.queryid, s.query, s.calls, s.total_exec_time, s.shared_blks_read
+FROM pg_stat_statements s
+WHERE s.queryid IS NOT NULL
+"""
+
+# Report metric name and the function ranking a query delta for it.
+REPORT_METRICS = {
+    "total_time": lambda delta: delta["total_time_ms"],
+    "mean_time": lambda delta: delta["mean_time_ms"],
+    "calls": lambda delta: delta["calls"],
+    "shared_blks_read": lambda delta: delta["shared_blks_read"],
+}
+
+
+def compute_deltas(previous_sample: dict, current_sample: dict) -> list:
+    """
+    Computes the per query statistics between two pg_stat_statements samples. Queries whose counters went backwards
+    (e.g. evicted and tracked again) are reported with their current counters.
+
+    Args
+        previous_sample(dict): Counters (calls, total time, shared blocks read) keyed by (userid, dbid, queryid).
+        current_sample(dict): Counters of the current sample with the same keys.
+
+    Returns
+        List of deltas for the queries that were called since the previous sample
+    """
+    deltas = []
+    for key, (query, calls, total_time, shared_blks_read) in current_sample.items():
+        previous = previous_sample.get(key)
+        if previous and previous[1] <= calls:
+            calls, total_time, shared_blks_read = (
+                calls - previous[1],
+                total_time - previous[2],
+                shared_blks_read - previous[3],
+            )
+        if calls <= 0:
+            continue
+        deltas.append(
+            {
+                "queryid": str(key[2]),
+                "query": query,
+                "calls": calls,
+                "total_time_ms": round(total_time, 3),
+                "mean_time_ms": round(total_time / calls, 3),
+                "shared_blks_read": shared_blks_read,
+            }
+        )
+    return deltas
+
+
+def build_report(deltas: list, top_n: int, max_query_length: int, interval_seconds: float) -> dict:
+    """
+    Builds the top-N report for every metric. The query texts are only included once, in the queries map.
+
+    Args
+        deltas(list): Per query deltas returned by compute_deltas.
+        top_n(int): Number of queries reported per metric.
+        max_query_length(int): Query texts are truncated to this length.
+        interval_seconds(float): Seconds covered by the deltas.
+
+    Returns
+        Report as a JSON serializable dict
+    """
+    report = {"timestamp": int(time.time()), "interval_seconds": round(interval_seconds, 3), "top": {}, "queries": {}}
+    for metric, rank in REPORT_METRICS.items():
+        top = sorted(deltas, key=rank, reverse=True)[:top_n]
+        report["top"][metric] = [{key: value for key, value in delta.items() if key != "query"} for delta in top]
+        for delta in top:
+            report["queries"][delta["queryid"]] = delta["query"][:max_query_length]
+    return report
+
+
+class QueryStatisticsReporter:
+    """
+    This is used to publish a compact top-N report of the queries tracked by pg_stat_statements on a local pub/sub
+    topic. Every report contains the deltas since the previous sample, and the statistics are reset on a schedule so
+    that pg_stat_statements does not fill up with queries that are no longer run.
+    """
+
+    def __init__(self, ipc_client: GreengrassCoreIPCClientV2, database_client: DatabaseClient = None) -> None:
+        self.__ipc_client = ipc_client
+        self.database_client = database_client or DatabaseClient()
+        self.__previous_sample = None
+        self.__previous_sample_time = None
+        self.__last_reset_time = time.monotonic()
+
+    def run(self, configuration: ComponentConfiguration) -> None:
+        """
+        Samples pg_stat_statements and publishes the report. The first sample only establishes the baseline. Called
+        periodically by the scheduler.
+
+        Args
+            configuration(ComponentConfiguration): Current configuration of the component.
+
+        Returns
+            None
+        """
+        statistics_config = configuration.get_query_statistics_config()
+        if not statistics_config[QUERY_STATISTICS_ENABLED_KEY]:
+            self.__previous_sample = None
+            return
+        self.database_client.configure(configuration)
+        self.database_client.execute(CREATE_EXTENSION_STATEMENT)
+        current_sample = self._sample()
+        now = time.monotonic()
+        if self.__previous_sample is not None:
+            report = build_report(
+                compute_deltas(self.__previous_sample, current_sample),
+                statistics_config[QUERY_STATISTICS_TOP_N_KEY],
+                statistics_config[QUERY_STATISTICS_MAX_QUERY_LENGTH_KEY],
+                now - self.__previous_sample_time,
+            )
+            self._publish(statistics_config[QUERY_STATISTICS_TOPIC_KEY], report)
+        self.__previous_sample = current_sample
+        self.__previous_sample_time = now
+
+        reset_interval = statistics_config[QUERY_STATISTICS_RESET_INTERVAL_KEY]
+        if reset_interval and now - self.__last_reset_time >= reset_interval:
+            logging.info("Resetting the query statistics")
+            self.database_client.query(RESET_STATEMENT)
+            # Counters restart from zero, so the next deltas are the counters themselves
+            self.__previous_sample = {}
+            self.__last_reset_time = now
+
+    def _sample(self) -> dict:
+        return {
+            (userid, dbid, queryid): (query, calls, total_time, shared_blks_read)
+            for userid, dbid, queryid, query, calls, total_time, shared_blks_read in self.database_client.query(
+                SAMPLE_QUERY
+            )
+        }
+
+    def _publish(self, topic: str, report: dict) -> None:
+        try:
+            self.__ipc_client.publish_to_topic(
+                topic=topic, publish_message=PublishMessage(json_message=JsonMessage(message=report))
+            )
+        except Exception:
+            logging.exception("Exception occurred while publishing the query statistics to the topic: %s", topic)
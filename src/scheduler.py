@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+
+from src.constants import SCHEDULED_JOB_TIMEOUT_SECONDS
+from src.executor import BlockingExecutor
+
+
+class ScheduledJob:
+    """
+    A job registered with the scheduler together with its run interval.
+    """
+
+    def __init__(self, name: str, interval_seconds: float, func, delay_seconds: float = None) -> None:
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self.next_run = time.monotonic() + (interval_seconds if delay_seconds is None else delay_seconds)
+
+
+class Scheduler:
+    """
+    This is used to run the periodic jobs of the component (e.g. database maintenance) from the asyncio event loop.
+    Jobs are blocking functions run on the executor one after the other, so a long running job delays the next ones
+    instead of running concurrently with them.
+    """
+
+    def __init__(self, executor: BlockingExecutor) -> None:
+        self.__executor = executor
+        self.__jobs = []
+
+    def add_job(self, name: str, interval_seconds: float, func, delay_seconds: float = None) -> None:
+        """
+        Registers a job that is run every interval_seconds. The first run happens one interval after registration,
+        unless a delay is given.
+
+        Args
+            name(str): Name of the job used for logging.
+            interval_seconds(float): Seconds between two runs of the job.
+            func(Callable): Blocking function called without arguments on every run.
+            delay_seconds(float): Seconds before the first run, defaults to interval_seconds.
+
+        Returns
+            None
+        """
+        self.__jobs.append(ScheduledJob(name, interval_seconds, func, delay_seconds))
+
+    async def run(self) -> None:
+        "Runs the jobs until cancelled"
+        if not self.__jobs:
+            return
+        while True:
+            await asyncio.sleep(await self.run_pending())
+
+    async def run_pending(self) -> float:
+        """
+        Runs every job that is due and reschedules it.
+
+        Returns
+            Seconds until the next job is due
+        """
+        for job in self.__jobs:
+            if time.monotonic() < job.next_run:
+                continue
+            try:
+                await self.__executor.run(job.func, timeout=SCHEDULED_JOB_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logging.error("The scheduled job: %s did not complete in time", job.name)
+            except Exception:
+                logging.exception("Exception occurred while running the scheduled job: %s", job.name)
+            job.next_run = time.monotonic() + job.interval_seconds
+        return max(0, min(job.next_run for job in self.__jobs) - time.monotonic())
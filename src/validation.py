@@ -0,0 +1,392 @@
+import ipaddress
+import json
+import logging
+import re
+from pathlib import Path
+
+from src.configuration import ComponentConfiguration
+from src.constants import IMAGE_SERVER_VERSION_KEY, SETTINGS_CATALOG_PATH
+
+MEMORY_UNITS = {"B": 1, "kB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+TIME_UNITS = {"us": 0.001, "ms": 1, "s": 1000, "min": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+BOOLEAN_VALUES = ("on", "off", "true", "false", "yes", "no", "1", "0")
+# Enum values accepted by the server that are not listed in pg_settings.enumvals
+HIDDEN_ENUM_VALUES = {"wal_level": ("archive", "hot_standby")}
+INCLUDE_DIRECTIVES = ("include", "include_if_exists", "include_dir")
+
+HBA_CONNECTION_TYPES = ("local", "host", "hostssl", "hostnossl", "hostgssenc", "hostnogssenc")
+HBA_AUTH_METHODS = (
+    "trust",
+    "reject",
+    "scram-sha-256",
+    "md5",
+    "password",
+    "gss",
+    "sspi",
+    "ident",
+    "peer",
+    "pam",
+    "ldap",
+    "radius",
+    "cert",
+)
+HBA_ADDRESS_KEYWORDS = ("all", "samehost", "samenet")
+HOSTNAME_PATTERN = re.compile(r"^\.?[A-Za-z0-9]([A-Za-z0-9-]*[A-Za-z0-9])?(\.[A-Za-z0-9]([A-Za-z0-9-]*[A-Za-z0-9])?)*$")
+
+POSTGRESQL_CONF_LINE_PATTERN = re.compile(
+    r"""^\s*(?P<name>[A-Za-z_][A-Za-z0-9_$.\-]*)\s*=?\s*"""
+    r"""(?P<value>'(?:[^'\\]|\\.|'')*'|[^\s#']+)?\s*(?:#.*)?$"""
+)
+INTEGER_LITERAL_PATTERN = re.compile(r"^(0[xX][0-9A-Fa-f]+|0[0-7]+)$")
+NUMBER_WITH_UNIT_PATTERN = re.compile(r"^(?P<number>[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(?P<unit>[A-Za-z]*)$")
+
+
+class ConfigurationValidationError(Exception):
+    """
+    Raised when a PostgreSQL configuration file fails the pre-flight validation.
+    """
+
+
+def load_settings_catalog(server_version: str) -> dict:
+    """
+    Loads the settings catalog (pg_settings of the server version) shipped with the component.
+
+    Args
+        server_version(str): Major version of the PostgreSQL server, e.g. "15".
+
+    Returns
+        Settings keyed by their lowercase name, or None if there is no catalog for the version
+    """
+    catalog_path = Path(SETTINGS_CATALOG_PATH).joinpath(f"{server_version}.json")
+    if not catalog_path.is_file():
+        return None
+    with open(catalog_path) as catalog_file:
+        return {name.lower(): setting for name, setting in json.load(catalog_file).items()}
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value.startswith("'") and value.endswith("'"):
+        return re.sub(r"''|\\(.)", lambda match: match.group(1) or "'", value[1:-1])
+    return value
+
+
+def parse_postgresql_conf(content: str) -> tuple:
+    """
+    Parses the content of a postgresql.conf file.
+
+    Args
+        content(str): Content of the file.
+
+    Returns
+        Tuple of the (line number, name, value) parameters and the syntax errors
+    """
+    parameters, errors = [], []
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        match = POSTGRESQL_CONF_LINE_PATTERN.match(line)
+        if not match or match.group("value") is None:
+            errors.append(f"line {line_number}: syntax error in '{line.strip()}'")
+            continue
+        parameters.append((line_number, match.group("name"), _unquote(match.group("value"))))
+    return parameters, errors
+
+
+def get_shared_preload_libraries(content: str) -> list:
+    """
+    Returns the libraries preloaded by a postgresql.conf file. As on the server, the last setting of the parameter
+    wins. Files included from the file are not read.
+
+    Args
+        content(str): Content of the file.
+
+    Returns
+        Names of the libraries, empty if the parameter is not set
+    """
+    libraries = []
+    for _, name, value in parse_postgresql_conf(content)[0]:
+        if name.lower() == "shared_preload_libraries":
+            libraries = [library.strip().strip('"') for library in value.split(",") if library.strip()]
+    return libraries
+
+
+def _is_boolean(value: str) -> bool:
+    "Checks a value the same way the server parses Boolean parameters, which accepts unique prefixes"
+    value = value.lower()
+    if value in ("1", "0"):
+        return True
+    if len(value) >= 2 and ("on".startswith(value) or "off".startswith(value)):
+        return True
+    return len(value) > 0 and any(keyword.startswith(value) for keyword in ("true", "false", "yes", "no"))
+
+
+def _convert_to_base_unit(number: float, unit: str, base_unit: str) -> float:
+    if not unit:
+        return number
+    for units in (MEMORY_UNITS, TIME_UNITS):
+        base_unit_name = base_unit.lstrip("0123456789")
+        if unit in units and base_unit_name in units:
+            base_multiplier = int(base_unit[: len(base_unit) - len(base_unit_name)] or 1)
+            return number * units[unit] / (units[base_unit_name] * base_multiplier)
+    raise ValueError(f"invalid unit '{unit}'")
+
+
+def _validate_enum(name: str, value: str, setting: dict) -> str:
+    allowed = [allowed_value.lower() for allowed_value in setting["values"]]
+    allowed.extend(HIDDEN_ENUM_VALUES.get(name.lower(), ()))
+    if "on" in allowed or "off" in allowed:
+        allowed.extend(BOOLEAN_VALUES)
+    if value.lower() not in allowed:
+        return f"invalid value '{value}' for parameter '{name}', available values: {', '.join(setting['values'])}"
+    return None
+
+
+def _parse_number(value: str, setting_type: str) -> tuple:
+    "Returns the number and unit of a numeric value, raises ValueError if the value is not a number"
+    value = value.strip()
+    if setting_type == "integer" and INTEGER_LITERAL_PATTERN.match(value):
+        # Integers are parsed with strtol, so hexadecimal and octal (e.g. 0600) literals are accepted
+        return float(int(value, 16 if value.lower().startswith("0x") else 8)), ""
+    match = NUMBER_WITH_UNIT_PATTERN.match(value)
+    if not match:
+        raise ValueError(f"invalid number '{value}'")
+    return float(match.group("number")), match.group("unit")
+
+
+def _validate_number(name: str, value: str, setting: dict) -> str:
+    try:
+        number, unit = _parse_number(value, setting["type"])
+    except ValueError:
+        return f"invalid value '{value}' for parameter '{name}', expected a number"
+    if unit and not setting.get("unit"):
+        return f"invalid value '{value}' for parameter '{name}', the parameter does not accept units"
+    try:
+        number = _convert_to_base_unit(number, unit, setting.get("unit", ""))
+    except ValueError:
+        return f"invalid unit in '{value}' for parameter '{name}'"
+    if setting["type"] == "integer":
+        number = round(number)
+    if not setting["min"] <= number <= setting["max"]:
+        unit_suffix = " {}".format(setting["unit"]) if setting.get("unit") else ""
+        return f"value '{value}' is out of range for parameter '{name}' ({setting['min']} .. {setting['max']}{unit_suffix})"
+    return None
+
+
+def validate_parameter(name: str, value: str, setting: dict) -> str:
+    """
+    Validates the value of a parameter against its settings catalog entry.
+
+    Args
+        name(str): Name of the parameter.
+        value(str): Unquoted value of the parameter.
+        setting(dict): Catalog entry of the parameter.
+
+    Returns
+        Error message, or None if the value is valid
+    """
+    if setting["context"] == "internal":
+        return f"parameter '{name}' cannot be changed"
+    setting_type = setting["type"]
+    if setting_type == "bool" and not _is_boolean(value):
+        return f"parameter '{name}' requires a Boolean value, got '{value}'"
+    if setting_type == "enum":
+        return _validate_enum(name, value, setting)
+    if setting_type in ("integer", "real"):
+        return _validate_number(name, value, setting)
+    return None
+
+
+def validate_postgresql_conf(content: str, catalog: dict) -> list:
+    """
+    Validates the syntax of a postgresql.conf file, and the parameter names, units and ranges against the settings
+    catalog. Custom parameters (containing a dot) and included files cannot be validated and are only logged.
+
+    Args
+        content(str): Content of the file.
+        catalog(dict): Settings catalog of the target server version, None to only validate the syntax.
+
+    Returns
+        List of errors
+    """
+    parameters, errors = parse_postgresql_conf(content)
+    for line_number, name, value in parameters:
+        if name.lower() in INCLUDE_DIRECTIVES:
+            logging.warning("line {}: the file included by {} will not be validated".format(line_number, name))
+            continue
+        if catalog is None:
+            continue
+        if "." in name:
+            logging.debug("line {}: custom parameter {} will not be validated".format(line_number, name))
+            continue
+        setting = catalog.get(name.lower())
+        if setting is None:
+            errors.append(f"line {line_number}: unrecognized configuration parameter '{name}'")
+            continue
+        error = validate_parameter(name, value, setting)
+        if error:
+            errors.append(f"line {line_number}: {error}")
+    return sorted(errors, key=lambda error: int(error.split(":")[0].split()[1]))
+
+
+def tokenize_auth_file_line(line: str) -> list:
+    "Splits a pg_hba.conf/pg_ident.conf line into fields, keeping quoted and comma separated values together"
+    fields, field, quoted = [], "", False
+    for char in line:
+        if char == '"':
+            quoted = not quoted
+            field += char
+        elif char == "#" and not quoted:
+            break
+        elif char.isspace() and not quoted:
+            if field:
+                fields.append(field)
+            field = ""
+        else:
+            field += char
+    if field:
+        fields.append(field)
+    return fields
+
+
+def _is_ip_address(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _parse_hba_address(fields: list) -> list:
+    "Returns the fields following the address (and IP mask) of a host record, raises ValueError if the address is invalid"
+    address, remaining = fields[0], fields[1:]
+    if "/" in address:
+        try:
+            ipaddress.ip_network(address, strict=False)
+        except ValueError:
+            raise ValueError(f"invalid IP address '{address}'")
+    elif _is_ip_address(address):
+        if not remaining or not _is_ip_address(remaining[0]):
+            raise ValueError(f"specifying both host name and CIDR mask is invalid or IP mask missing for '{address}'")
+        remaining = remaining[1:]
+    elif address not in HBA_ADDRESS_KEYWORDS and not HOSTNAME_PATTERN.match(address.strip('"')):
+        raise ValueError(f"invalid IP address or host name '{address}'")
+    return remaining
+
+
+def validate_hba_record(fields: list) -> str:
+    """
+    Validates the fields of a pg_hba.conf record.
+
+    Args
+        fields(list): Fields of the record.
+
+    Returns
+        Error message, or None if the record is valid
+    """
+    connection_type = fields[0]
+    if connection_type not in HBA_CONNECTION_TYPES:
+        return f"invalid connection type '{connection_type}'"
+    if len(fields) < 4:
+        return "end-of-line before authentication method"
+    remaining = fields[3:]
+    if connection_type != "local":
+        try:
+            remaining = _parse_hba_address(remaining)
+        except ValueError as e:
+            return str(e)
+    if not remaining:
+        return "end-of-line before authentication method"
+    method = remaining[0]
+    if method not in HBA_AUTH_METHODS:
+        return f"invalid authentication method '{method}'"
+    for option in remaining[1:]:
+        if "=" not in option:
+            return f"authentication option not in name=value format: '{option}'"
+    return None
+
+
+def validate_pg_hba_conf(content: str) -> list:
+    """
+    Validates the syntax of a pg_hba.conf file. Included files cannot be validated and are only logged.
+
+    Args
+        content(str): Content of the file.
+
+    Returns
+        List of errors
+    """
+    errors = []
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        fields = tokenize_auth_file_line(line)
+        if not fields:
+            continue
+        if fields[0] in INCLUDE_DIRECTIVES:
+            logging.warning("line {}: the file included by {} will not be validated".format(line_number, fields[0]))
+            continue
+        error = validate_hba_record(fields)
+        if error:
+            errors.append(f"line {line_number}: {error}")
+    return errors
+
+
+def validate_pg_ident_conf(content: str) -> list:
+    """
+    Validates the syntax of a pg_ident.conf file. Included files cannot be validated and are only logged.
+
+    Args
+        content(str): Content of the file.
+
+    Returns
+        List of errors
+    """
+    errors = []
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        fields = tokenize_auth_file_line(line)
+        if fields and fields[0] in INCLUDE_DIRECTIVES:
+            logging.warning("line {}: the file included by {} will not be validated".format(line_number, fields[0]))
+            continue
+        if fields and len(fields) != 3:
+            errors.append(f"line {line_number}: expected map name, system user name and database user name")
+    return errors
+
+
+def validate_configuration_files(configuration: ComponentConfiguration) -> None:
+    """
+    Validates the PostgreSQL configuration files of the component configuration before they are applied, so that an
+    invalid file is detected before the running container is replaced.
+
+    Args
+        configuration(ComponentConfiguration): Configuration of the component.
+
+    Returns
+        None
+
+    Raises
+        ConfigurationValidationError: If any of the configuration files is invalid
+    """
+    server_version = configuration.get_image_config()[IMAGE_SERVER_VERSION_KEY]
+    errors = []
+    for conf_file, file_path in configuration.get_pg_config_files().items():
+        try:
+            content = Path(file_path).read_text()
+        except (OSError, UnicodeDecodeError) as e:
+            errors.append(f"{file_path}: could not be read: {e}")
+            continue
+        if conf_file == "postgresql.conf":
+            catalog = load_settings_catalog(server_version)
+            if catalog is None:
+                logging.warning(
+                    "No settings catalog for PostgreSQL {}, only the syntax of {} is validated".format(
+                        server_version, file_path
+                    )
+                )
+            file_errors = validate_postgresql_conf(content, catalog)
+        elif conf_file == "pg_hba.conf":
+            file_errors = validate_pg_hba_conf(content)
+        else:
+            file_errors = validate_pg_ident_conf(content)
+        errors.extend(f"{file_path}: {error}" for error in file_errors)
+    if errors:
+        raise ConfigurationValidationError(
+            "Invalid postgresql configuration files, the configuration is not applied:\n" + "\n".join(errors)
+        )
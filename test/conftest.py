@@ -0,0 +1,30 @@
+import pytest
+from awsiot.greengrasscoreipc.model import GetConfigurationResponse
+from src.configuration import ComponentConfiguration
+from src.database import DatabaseClient
+
+
+@pytest.fixture()
+def make_configuration():
+    """
+    Returns a factory of component configurations built from configuration sections, e.g.
+    make_configuration(Maintenance={"Enabled": True}).
+    """
+
+    def _make_configuration(**sections):
+        return ComponentConfiguration(GetConfigurationResponse(value=sections), None)
+
+    return _make_configuration
+
+
+@pytest.fixture()
+def mock_database_query(mocker):
+    """
+    Returns a function patching DatabaseClient.query to return the rows given for each statement, e.g.
+    mock_database_query({ACTIVE_BACKENDS_QUERY: [(0,)]}).
+    """
+
+    def _mock_database_query(results):
+        return mocker.patch.object(DatabaseClient, "query", side_effect=lambda statement, params=None: results[statement])
+
+    return _mock_database_query
@@ -2,6 +2,7 @@ import pytest
 import src.constants as consts
 from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
 from awsiot.greengrasscoreipc.model import GetConfigurationResponse, GetSecretValueResponse, SecretValue
+from src.configuration import ComponentConfiguration
 from src.configuration_handler import ComponentConfigurationIPCHandler
 
 
@@ -128,3 +129,77 @@ def test_configuration_set_conf_volumes(mocker):
     assert "postgresql.conf" in pg_conf_files
     assert "pg_hba.conf" in pg_conf_files
     assert "pg_ident.conf" in pg_conf_files
+
+
+def test_configuration_set_maintenance_config(mocker):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    ipc_client = GreengrassCoreIPCClientV2()
+    configuration_response = GetConfigurationResponse(
+        value={"Maintenance": {"Enabled": True, "Windows": ["02:00-04:00"], "Unsupported": 1}}
+    )
+    mocker.patch.object(GreengrassCoreIPCClientV2, "get_configuration", return_value=configuration_response)
+    configuration_handler = ComponentConfigurationIPCHandler(ipc_client)
+    maintenance_config = configuration_handler.get_configuration().get_maintenance_config()
+    assert maintenance_config["Enabled"]
+    assert maintenance_config["Windows"] == ["02:00-04:00"]
+    assert maintenance_config["IntervalSeconds"] == consts.DEFAULT_MAINTENANCE_CONFIG["IntervalSeconds"]
+    assert "Unsupported" not in maintenance_config
+
+
+def test_configuration_snapshot_diff():
+    secret_response = GetSecretValueResponse(
+        secret_value=SecretValue(
+            secret_string='{"POSTGRES_USER": "this-is-a-username", "POSTGRES_PASSWORD": "Thi5-is-@-password"}'
+        )
+    )
+    configuration = ComponentConfiguration(GetConfigurationResponse(value={}), secret_response)
+    same_configuration = ComponentConfiguration(GetConfigurationResponse(value={}), secret_response)
+    snapshot = configuration.snapshot()
+    assert snapshot is configuration.snapshot()
+    assert snapshot == same_configuration.snapshot()
+    assert hash(snapshot) == hash(same_configuration.snapshot())
+    assert snapshot.diff(same_configuration.snapshot()) == ()
+    assert "Thi5-is-@-password" not in repr(snapshot.db_credentials)
+    with pytest.raises(AttributeError):
+        snapshot.host_port = "8000"
+
+    updated_configuration = ComponentConfiguration(
+        GetConfigurationResponse(
+            value={"ContainerMapping": {"HostPort": "8000"}, "Maintenance": {"Enabled": True}}
+        ),
+        secret_response,
+    )
+    changes = snapshot.diff(updated_configuration.snapshot())
+    assert [(change.field, change.requires_new_container) for change in changes] == [
+        ("host_port", True),
+        ("maintenance", False),
+    ]
+    assert changes[0].old_value == consts.DEFAULT_HOST_PORT
+    assert changes[0].new_value == "8000"
+    assert configuration != updated_configuration
+    assert snapshot.fingerprint != updated_configuration.snapshot().fingerprint
+    assert snapshot.container_fingerprint != updated_configuration.snapshot().container_fingerprint
+
+    maintenance_configuration = ComponentConfiguration(
+        GetConfigurationResponse(value={"Maintenance": {"Enabled": True}}), secret_response
+    )
+    assert snapshot.fingerprint != maintenance_configuration.snapshot().fingerprint
+    assert snapshot.container_fingerprint == maintenance_configuration.snapshot().container_fingerprint
+
+    server_version_configuration = ComponentConfiguration(
+        GetConfigurationResponse(value={"Image": {"ServerVersion": "16"}}), secret_response
+    )
+    changes = snapshot.diff(server_version_configuration.snapshot())
+    assert [(change.field, change.requires_new_container) for change in changes] == [("server_version", False)]
+    assert snapshot.container_fingerprint == server_version_configuration.snapshot().container_fingerprint
+
+
+def test_configuration_snapshot_tracks_file_content(tmp_path):
+    conf_file = tmp_path.joinpath("postgresql.conf")
+    conf_file.write_text("max_connections = 100\n")
+    configuration_response = GetConfigurationResponse(value={"ConfigurationFiles": {"postgresql.conf": str(conf_file)}})
+    snapshot = ComponentConfiguration(configuration_response, None).snapshot()
+    conf_file.write_text("max_connections = 200\n")
+    changes = snapshot.diff(ComponentConfiguration(configuration_response, None).snapshot())
+    assert [change.field for change in changes] == ["pg_config_files"]
+    assert changes[0].requires_new_container
@@ -1,3 +1,8 @@
+import asyncio
+import json
+import threading
+import time
+
 import docker
 import pytest
 from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
@@ -10,10 +15,12 @@ from awsiot.greengrasscoreipc.model import (
     SubscribeToConfigurationUpdateResponse,
 )
 from docker.models.containers import Container, ContainerCollection
+from docker.models.images import Image, ImageCollection
 from src.configuration import ComponentConfiguration
 from src.configuration_handler import ComponentConfigurationIPCHandler
 from src.constants import POSTGRES_IMAGE, POSTGRES_PASSWORD_FILE_KEY, POSTGRES_USERNAME_FILE_KEY
-from src.container import ContainerManagement
+from src.container import ContainerManagement, ReconcileReason
+from src.executor import BlockingExecutor
 
 
 @pytest.fixture()
@@ -22,6 +29,43 @@ def change_test_dir(tmpdir, monkeypatch):
     return tmpdir
 
 
+def create_container_management(ipc_client, docker_client, configuration_handler):
+    executor = BlockingExecutor(2, 10, "test")
+    container_management = ContainerManagement(ipc_client, docker_client, configuration_handler, executor, executor)
+    asyncio.run(container_management.load_configuration())
+    return container_management
+
+
+def run_until_complete(coroutine):
+    async def _run():
+        result = await coroutine
+        # Let the log following tasks complete
+        await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}))
+        return result
+
+    return asyncio.run(_run())
+
+
+def log_stream(*lines):
+    # Closable like the docker log stream
+    yield from lines
+
+
+def subscribe_and_reconcile(container_management):
+    async def _subscribe_and_reconcile():
+        container_management.loop = asyncio.get_running_loop()
+        container_management.subscribe_to_configuration_updates()
+        # Let the callbacks scheduled from the IPC stream put their events on the queue
+        await asyncio.sleep(0)
+        batch = []
+        while not container_management.reconcile_queue.empty():
+            batch.append(container_management.reconcile_queue.get_nowait())
+        await container_management.reconcile(batch)
+        return batch
+
+    return run_until_complete(_subscribe_and_reconcile())
+
+
 def test_container_management_update_event(mocker):
     mocker.patch("awsiot.greengrasscoreipc", return_value=None)
     mocker.patch("src.configuration_handler", return_value=None)
@@ -34,9 +78,11 @@ def test_container_management_update_event(mocker):
         return SubscribeToConfigurationUpdateResponse()
 
     mocker.patch.object(mock_ipc_client, "subscribe_to_configuration_update", side_effect=this_triggers_callbacks)
-    mocker.patch.object(ContainerManagement, "manage_postgresql_container", return_value=None)
+    mock_manage_container = mocker.patch.object(ContainerManagement, "manage_postgresql_container", return_value=None)
 
-    ContainerManagement(mock_ipc_client, None, mock_configuration_handler)
+    cm = create_container_management(mock_ipc_client, None, mock_configuration_handler)
+    assert subscribe_and_reconcile(cm) == []
+    assert not mock_manage_container.called
 
 
 def test_container_management_create_or_recreate_container(mocker, change_test_dir):
@@ -71,22 +117,23 @@ def test_container_management_create_or_recreate_container(mocker, change_test_d
     mocker.patch.object(GreengrassCoreIPCClientV2, "get_configuration", return_value=mock_get_configuration_response)
     mock_container = Container()
     mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
-    mocker.patch("threading.Thread", return_value=None)
+    mocker.patch("docker.DockerClient.images", return_value=ImageCollection())
+    mocker.patch.object(docker.DockerClient.images, "get", return_value=Image())
     mocker.patch.object(docker.DockerClient.containers, "get", side_effect=Exception("Container does not exist"))
     mock_stop_container = mocker.patch.object(Container, "stop", return_value=None)
     mock_run_container = mocker.patch.object(docker.DockerClient.containers, "run", return_value=mock_container)
     mock_remove_container = mocker.patch.object(Container, "remove", return_value=None)
-    mock_logs_container = mocker.patch.object(Container, "logs", return_value=[])
-    cm = ContainerManagement(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    mock_logs_container = mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream())
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
     cm.current_configuration = ComponentConfiguration(mock_get_configuration_response, secret_value_reponse)
-    cm.subscribe_to_configuration_updates()
+    assert subscribe_and_reconcile(cm) == [(ReconcileReason.CONFIGURATION_UPDATE, None)]
     assert not mock_remove_container.called
     assert not mock_stop_container.called
 
     assert mock_run_container.called
     assert mock_logs_container.called
     mocker.patch.object(docker.DockerClient.containers, "get", return_value=mock_container)
-    cm.manage_postgresql_container(mock_configuration_handler.get_configuration())
+    run_until_complete(cm.manage_postgresql_container(mock_configuration_handler.get_configuration()))
 
     assert mock_remove_container.called
     assert mock_stop_container.called
@@ -128,14 +175,18 @@ def test_container_management_run_container(mocker, change_test_dir):
     mocker.patch.object(GreengrassCoreIPCClientV2, "get_configuration", return_value=mock_get_configuration_response)
     mocker.patch.object(GreengrassCoreIPCClientV2, "get_secret_value", return_value=secret_value_reponse)
     mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch("docker.DockerClient.images", return_value=ImageCollection())
+    mocker.patch.object(docker.DockerClient.images, "get", return_value=Image())
     mocker.patch.object(docker.DockerClient.containers, "get", side_effect=Exception("Container does not exist"))
     spy_docker_run = mocker.spy(docker.DockerClient.containers, "run")
     mock_remove_container = mocker.patch.object(Container, "remove", return_value=None)
     mock_stop_container = mocker.patch.object(Container, "stop", return_value=None)
     mocker.patch("pathlib.Path.is_file", return_value=True)
-    cm = ContainerManagement(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    mocker.patch("src.container.validate_configuration_files", return_value=None)
+    mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream())
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
     cm.current_configuration = ComponentConfiguration(mock_get_configuration_response, None)
-    cm.subscribe_to_configuration_updates()
+    subscribe_and_reconcile(cm)
     assert not mock_remove_container.called
     assert not mock_stop_container.called
     args, kwargs = spy_docker_run.call_args
@@ -181,7 +232,6 @@ def test_container_management_no_update_when_same_configuration(mocker):
     )
 
     mocker.patch.object(GreengrassCoreIPCClientV2, "get_configuration", return_value=mock_get_configuration_response)
-    mocker.patch("threading.Thread", return_value=None)
     mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
     mocker.patch.object(docker.DockerClient.containers, "get", return_value=Container())
     mocker.patch("pathlib.Path.is_file", return_value=True)
@@ -189,12 +239,161 @@ def test_container_management_no_update_when_same_configuration(mocker):
     mock_stop_container = mocker.patch.object(Container, "stop", return_value=None)
     mock_run_container = mocker.patch.object(docker.DockerClient.containers, "run", return_value=None)
     mock_restart_container = mocker.patch.object(Container, "restart", return_value=None)
-    mock_logs_container = mocker.patch.object(Container, "logs", return_value=[])
+    mock_logs_container = mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream())
 
-    cm = ContainerManagement(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
-    cm.subscribe_to_configuration_updates()
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    subscribe_and_reconcile(cm)
     assert not mock_remove_container.called
     assert not mock_stop_container.called
     assert not mock_run_container.called
     assert not mock_restart_container.called
     assert not mock_logs_container.called
+
+
+def test_container_management_coalesces_configuration_updates(mocker):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mock_ipc_client = GreengrassCoreIPCClientV2()
+    mock_configuration_handler = ComponentConfigurationIPCHandler(mock_ipc_client)
+    mock_get_configuration = mocker.patch.object(
+        GreengrassCoreIPCClientV2, "get_configuration", return_value=GetConfigurationResponse(value={})
+    )
+    cm = create_container_management(mock_ipc_client, None, mock_configuration_handler)
+    mock_get_configuration.reset_mock()
+    mock_manage_container = mocker.patch.object(ContainerManagement, "manage_postgresql_container", return_value=None)
+
+    run_until_complete(cm.reconcile([(ReconcileReason.CONFIGURATION_UPDATE, None)] * 3))
+    assert mock_get_configuration.call_count == 1
+    assert not mock_manage_container.called
+
+
+def test_container_management_container_events(mocker):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mock_ipc_client = GreengrassCoreIPCClientV2()
+    mock_configuration_handler = ComponentConfigurationIPCHandler(mock_ipc_client)
+    mock_logs_container = mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream(b"restarted"))
+    cm = create_container_management(mock_ipc_client, None, mock_configuration_handler)
+    cm.postgresql_container = Container(attrs={"Id": "some-id", "Name": "some-container-name"})
+
+    run_until_complete(
+        cm.reconcile(
+            [
+                (ReconcileReason.CONTAINER_EVENT, {"id": "other-id", "Action": "destroy"}),
+                (ReconcileReason.CONTAINER_EVENT, {"id": "some-id", "Action": "start"}),
+            ]
+        )
+    )
+    assert cm.postgresql_container is not None
+    assert mock_logs_container.called
+
+    run_until_complete(cm.reconcile([(ReconcileReason.CONTAINER_EVENT, {"id": "some-id", "Action": "destroy"})]))
+    assert cm.postgresql_container is None
+
+
+def test_blocking_executor_timeout():
+    executor = BlockingExecutor(1, 0.01, "test")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(executor.run(time.sleep, 0.5))
+    assert asyncio.run(executor.run(sum, [1, 2], timeout=1)) == 3
+    executor.shutdown()
+
+
+@pytest.mark.parametrize(
+    "persisted,status,recreated", [(True, "running", False), (True, "exited", True), (False, "running", True)]
+)
+def test_container_management_startup_keeps_unchanged_container(mocker, change_test_dir, persisted, status, recreated):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mock_ipc_client = GreengrassCoreIPCClientV2()
+    mock_configuration_handler = ComponentConfigurationIPCHandler(mock_ipc_client)
+    mock_get_configuration = mocker.patch.object(
+        GreengrassCoreIPCClientV2, "get_configuration", return_value=GetConfigurationResponse(value={})
+    )
+    mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch.object(
+        docker.DockerClient.containers, "get", return_value=Container(attrs={"Id": "some-id", "State": {"Status": status}})
+    )
+    mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream())
+    mock_manage_container = mocker.patch.object(ContainerManagement, "manage_postgresql_container", return_value=None)
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    if persisted:
+        cm.fingerprint_path.write_text(cm.current_configuration.snapshot().container_fingerprint)
+    # Settings that do not affect the container may change while the component is stopped
+    mock_get_configuration.return_value = GetConfigurationResponse(value={"Maintenance": {"Enabled": True}})
+
+    run_until_complete(cm.reconcile([(ReconcileReason.STARTUP, None)]))
+    assert mock_manage_container.called == recreated
+    assert cm.current_configuration.get_maintenance_config()["Enabled"]
+    assert cm.fingerprint_path.read_text() == cm.current_configuration.snapshot().container_fingerprint
+
+
+def test_container_management_closes_log_stream_on_shutdown(mocker):
+    class BlockingLogStream:
+        def __init__(self):
+            self.closed = threading.Event()
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            self.closed.wait()
+            raise StopIteration
+
+        def close(self):
+            self.closed.set()
+
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mock_ipc_client = GreengrassCoreIPCClientV2()
+    mock_configuration_handler = ComponentConfigurationIPCHandler(mock_ipc_client)
+    mocker.patch.object(ContainerManagement, "reconcile", return_value=None)
+    mocker.patch.object(ContainerManagement, "_watch_docker_events", return_value=None)
+    logs_stream = BlockingLogStream()
+    mocker.patch.object(Container, "logs", return_value=logs_stream)
+    cm = create_container_management(mock_ipc_client, None, mock_configuration_handler)
+    cm.postgresql_container = Container(attrs={"Id": "some-id", "Name": "some-container-name"})
+
+    async def _run_and_shutdown():
+        cm._follow_container_logs()
+        run_task = asyncio.create_task(cm.run())
+        await asyncio.sleep(0.1)
+        run_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run_task
+
+    asyncio.run(_run_and_shutdown())
+    assert logs_stream.closed.is_set()
+
+
+def test_container_management_records_initialized_data_volume_after_restart(mocker, change_test_dir):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mock_ipc_client = GreengrassCoreIPCClientV2()
+    mock_configuration_handler = ComponentConfigurationIPCHandler(mock_ipc_client)
+    host_volume = change_test_dir.join("data")
+    mocker.patch.object(
+        GreengrassCoreIPCClientV2,
+        "get_configuration",
+        return_value=GetConfigurationResponse(value={"ContainerMapping": {"HostVolume": str(host_volume)}}),
+    )
+    mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch("docker.DockerClient.images", return_value=ImageCollection())
+    mocker.patch.object(docker.DockerClient.images, "get", return_value=Image())
+    running_container = Container(attrs={"Id": "some-id", "State": {"Status": "running"}})
+    mock_get_container = mocker.patch.object(
+        docker.DockerClient.containers, "get", side_effect=docker.errors.NotFound("Container does not exist")
+    )
+    mocker.patch.object(docker.DockerClient.containers, "run", return_value=running_container)
+    mocker.patch("src.container.validate_configuration_files", return_value=None)
+    mocker.patch.object(Container, "logs", side_effect=lambda **kwargs: log_stream())
+
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    run_until_complete(cm.reconcile([(ReconcileReason.STARTUP, None)]))
+    state = json.loads(cm.cluster_initialization.state_path.read_text())
+    assert state[str(host_volume)]["Pending"]
+
+    # The component restarts while initdb runs, and keeps the running container
+    host_volume.mkdir()
+    host_volume.join("PG_VERSION").write_text("16", encoding="utf-8")
+    mock_get_container.side_effect = None
+    mock_get_container.return_value = running_container
+    cm = create_container_management(mock_ipc_client, docker.DockerClient, mock_configuration_handler)
+    run_until_complete(cm.reconcile([(ReconcileReason.STARTUP, None)]))
+    state = json.loads(cm.cluster_initialization.state_path.read_text())
+    assert "Pending" not in state[str(host_volume)]
@@ -0,0 +1,21 @@
+import pytest
+from src.database import DatabaseClient
+
+
+def test_database_client_shutdown_cancels_running_statement(mocker, make_configuration):
+    connection = mocker.MagicMock(closed=False)
+    mocker.patch("src.database.psycopg2.connect", return_value=connection)
+    database_client = DatabaseClient()
+    database_client.configure(make_configuration())
+    database_client.execute("VACUUM")
+    database_client.shutdown()
+    assert connection.cancel.called
+    with pytest.raises(Exception, match="shut down"):
+        database_client.execute("VACUUM")
+
+
+def test_database_client_shutdown_without_connection(mocker):
+    connect = mocker.patch("src.database.psycopg2.connect")
+    database_client = DatabaseClient()
+    database_client.shutdown()
+    assert not connect.called
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import io
+import json
+import tarfile
+
+import docker
+import pytest
+from docker.models.containers import Container, ContainerCollection
+from docker.models.images import Image, ImageCollection
+from src.constants import POSTGRES_IMAGE
+from src.container import ContainerManagement
+from src.executor import BlockingExecutor
+from src.image import ImageManagement, get_image_reference
+
+DIGEST = "sha256:" + "a" * 64
+IMAGE_ID = "sha256:" + "b" * 64
+
+
+def write_image_archive(archive_path, repo_tags):
+    "Writes an image archive with the manifest of docker save and returns its digest"
+    manifest = json.dumps([{"Config": f"blobs/sha256/{IMAGE_ID[7:]}", "RepoTags": repo_tags, "Layers": []}]).encode()
+    with tarfile.open(archive_path, "w") as archive:
+        member = tarfile.TarInfo("manifest.json")
+        member.size = len(manifest)
+        archive.addfile(member, io.BytesIO(manifest))
+    return hashlib.sha256(archive_path.read_bytes()).hexdigest()
+
+
+@pytest.fixture()
+def mock_images(mocker):
+    mocker.patch("docker.DockerClient.images", return_value=ImageCollection())
+    return docker.DockerClient.images
+
+
+@pytest.mark.parametrize(
+    "image_config,expected",
+    [
+        ({}, POSTGRES_IMAGE),
+        ({"Digest": DIGEST}, f"postgres@{DIGEST}"),
+        ({"Name": "registry.local:5000/postgres:15", "Digest": DIGEST}, f"registry.local:5000/postgres@{DIGEST}"),
+    ],
+)
+def test_get_image_reference(image_config, expected, make_configuration):
+    assert get_image_reference(make_configuration(Image=image_config).get_image_config()) == expected
+
+
+def test_prepare_image_uses_local_image(mocker, mock_images, make_configuration):
+    mocker.patch.object(mock_images, "get", return_value=Image())
+    mock_pull = mocker.patch.object(mock_images, "pull", return_value=Image())
+    assert ImageManagement(docker.DockerClient).prepare_image(make_configuration(Image={})) == POSTGRES_IMAGE
+    assert not mock_pull.called
+
+
+def test_prepare_image_pulls_pinned_image(mocker, mock_images, make_configuration):
+    mocker.patch.object(mock_images, "get", side_effect=docker.errors.ImageNotFound("not found"))
+    mock_pull = mocker.patch.object(mock_images, "pull", return_value=Image())
+    reference = ImageManagement(docker.DockerClient).prepare_image(make_configuration(Image={"Digest": DIGEST}))
+    assert reference == f"postgres@{DIGEST}"
+    mock_pull.assert_called_once_with("postgres", tag=DIGEST)
+
+
+@pytest.mark.parametrize("local_image_id,loaded", [(None, True), ("sha256:" + "c" * 64, True), (IMAGE_ID, False)])
+def test_prepare_image_loads_archive(mocker, mock_images, tmp_path, make_configuration, local_image_id, loaded):
+    archive = tmp_path.joinpath("postgres.tar")
+    archive_digest = write_image_archive(archive, [POSTGRES_IMAGE])
+    local_image = docker.errors.ImageNotFound("not found") if local_image_id is None else Image(attrs={"Id": local_image_id})
+    mocker.patch.object(mock_images, "get", side_effect=[local_image, Image(attrs={"Id": IMAGE_ID})])
+    mock_pull = mocker.patch.object(mock_images, "pull", return_value=Image())
+    mock_load = mocker.patch.object(mock_images, "load", return_value=[Image(attrs={"Id": IMAGE_ID})])
+    configuration = make_configuration(Image={"ArchivePath": str(archive), "ArchiveDigest": archive_digest})
+    assert ImageManagement(docker.DockerClient).prepare_image(configuration) == POSTGRES_IMAGE
+    assert mock_load.called == loaded
+    assert not mock_pull.called
+
+
+@pytest.mark.parametrize(
+    "repo_tags,image_config,loaded_image_id",
+    [
+        (["postgres:other"], {}, IMAGE_ID),
+        ([POSTGRES_IMAGE], {"Digest": DIGEST}, IMAGE_ID),
+        ([POSTGRES_IMAGE], {}, "sha256:" + "c" * 64),
+    ],
+)
+def test_prepare_image_rejects_mismatching_archive(
+    mocker, mock_images, tmp_path, make_configuration, repo_tags, image_config, loaded_image_id
+):
+    archive = tmp_path.joinpath("postgres.tar")
+    archive_digest = write_image_archive(archive, repo_tags)
+    mocker.patch.object(
+        mock_images, "get", side_effect=[docker.errors.ImageNotFound("not found"), Image(attrs={"Id": loaded_image_id})]
+    )
+    mocker.patch.object(mock_images, "load", return_value=[Image(attrs={"Id": loaded_image_id})])
+    configuration = make_configuration(Image=dict(image_config, ArchivePath=str(archive), ArchiveDigest=archive_digest))
+    with pytest.raises(Exception):
+        ImageManagement(docker.DockerClient).prepare_image(configuration)
+
+
+@pytest.mark.parametrize("archive_digest", ["", "sha256:" + "0" * 64])
+def test_prepare_image_rejects_unverified_archive(mocker, mock_images, tmp_path, archive_digest, make_configuration):
+    archive = tmp_path.joinpath("postgres.tar")
+    archive.write_bytes(b"image archive")
+    mocker.patch.object(mock_images, "get", side_effect=docker.errors.ImageNotFound("not found"))
+    mock_load = mocker.patch.object(mock_images, "load", return_value=[])
+    configuration = make_configuration(Image={"ArchivePath": str(archive), "ArchiveDigest": archive_digest})
+    with pytest.raises(Exception):
+        ImageManagement(docker.DockerClient).prepare_image(configuration)
+    assert not mock_load.called
+
+
+def test_container_not_stopped_when_image_unavailable(mocker, mock_images, make_configuration):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mocker.patch.object(ContainerManagement, "__init__", return_value=None)
+    mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch.object(docker.DockerClient.containers, "get", return_value=Container())
+    mocker.patch.object(mock_images, "get", side_effect=docker.errors.ImageNotFound("not found"))
+    mocker.patch.object(mock_images, "pull", side_effect=docker.errors.APIError("registry unreachable"))
+    mock_stop_container = mocker.patch.object(Container, "stop", return_value=None)
+    container_management = ContainerManagement(None, None, None)
+    container_management.postgresql_container = None
+    container_management.docker_client = docker.DockerClient
+    container_management.image_management = ImageManagement(docker.DockerClient)
+    container_management.executor = BlockingExecutor(1, 10, "test")
+    with pytest.raises(docker.errors.APIError):
+        asyncio.run(container_management.manage_postgresql_container(make_configuration(Image={})))
+    assert not mock_stop_container.called
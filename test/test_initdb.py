@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from src.initdb import ClusterInitialization, get_init_script_volumes, get_initdb_environment
+
+
+def test_get_initdb_environment(make_configuration):
+    assert get_initdb_environment(make_configuration(Initdb={}).get_initdb_config()) == {}
+    initdb_config = make_configuration(
+        Initdb={"WalSegmentSizeMB": 64, "DataChecksums": True, "Locale": "C", "Encoding": "UTF8", "AuthMethod": "md5"}
+    ).get_initdb_config()
+    assert get_initdb_environment(initdb_config) == {
+        "POSTGRES_INITDB_ARGS": "--wal-segsize=64 --data-checksums --locale=C --encoding=UTF8",
+        "POSTGRES_HOST_AUTH_METHOD": "md5",
+    }
+
+
+@pytest.mark.parametrize("initdb_config", [{"WalSegmentSizeMB": 48}, {"WalSegmentSizeMB": 2048}, {"AuthMethod": "trust"}])
+def test_invalid_initdb_config(initdb_config, make_configuration):
+    with pytest.raises(Exception):
+        make_configuration(Initdb=initdb_config)
+
+
+def test_get_init_script_volumes(tmp_path, make_configuration):
+    for name in ("schema.sql", "data.sql.gz", "notes.txt"):
+        tmp_path.joinpath(name).write_text("")
+    scripts = [str(tmp_path.joinpath(name)) for name in ("schema.sql", "data.sql.gz", "notes.txt", "missing.sql")]
+    initdb_config = make_configuration(Initdb={"InitScripts": scripts}).get_initdb_config()
+    assert get_init_script_volumes(initdb_config) == [
+        f"{tmp_path.joinpath('schema.sql')}:/docker-entrypoint-initdb.d/00-schema.sql:ro",
+        f"{tmp_path.joinpath('data.sql.gz')}:/docker-entrypoint-initdb.d/01-data.sql.gz:ro",
+    ]
+
+
+def test_cluster_initialization_recorded_once_initialized(tmp_path, make_configuration):
+    host_volume = tmp_path.joinpath("postgresql")
+    state_path = tmp_path.joinpath("initdb.json")
+    cluster_initialization = ClusterInitialization(state_path)
+    configuration = make_configuration(Initdb={"Locale": "C"}, ContainerMapping={"HostVolume": str(host_volume)})
+    assert cluster_initialization.is_new_cluster(configuration)
+
+    cluster_initialization.start(configuration)
+    assert cluster_initialization.is_new_cluster(configuration)
+    assert json.loads(state_path.read_text())[str(host_volume)]["Pending"]
+
+    host_volume.mkdir()
+    host_volume.joinpath("PG_VERSION").write_text("15")
+    assert not cluster_initialization.is_new_cluster(configuration)
+    assert not cluster_initialization.is_new_cluster(
+        make_configuration(Initdb={"Locale": "en_US.utf8"}, ContainerMapping={"HostVolume": str(host_volume)})
+    )
+    assert "Pending" not in json.loads(state_path.read_text())[str(host_volume)]
+
+    # A data volume emptied after its initialization is initialized again
+    host_volume.joinpath("PG_VERSION").unlink()
+    assert cluster_initialization.is_new_cluster(configuration)
+
+
+def test_cluster_initialization_existing_data_volume(tmp_path, make_configuration):
+    host_volume = tmp_path.joinpath("postgresql")
+    host_volume.mkdir()
+    host_volume.joinpath("PG_VERSION").write_text("15")
+    cluster_initialization = ClusterInitialization(tmp_path.joinpath("initdb.json"))
+    assert not cluster_initialization.is_new_cluster(
+        make_configuration(Initdb={}, ContainerMapping={"HostVolume": str(host_volume)})
+    )
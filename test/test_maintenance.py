@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import docker
+import pytest
+from docker.models.containers import Container, ContainerCollection
+from src.database import DatabaseClient
+from src.maintenance import (
+    ACTIVE_BACKENDS_QUERY,
+    INDEX_STATISTICS_QUERY,
+    TABLE_STATISTICS_QUERY,
+    MaintenanceManager,
+    estimate_bloat_ratio,
+    in_maintenance_window,
+)
+
+MB = 1024 * 1024
+
+
+def get_query_results(tables=(), indexes=(), active_backends=0):
+    return {
+        TABLE_STATISTICS_QUERY: list(tables),
+        INDEX_STATISTICS_QUERY: list(indexes),
+        ACTIVE_BACKENDS_QUERY: [(active_backends,)],
+    }
+
+
+@pytest.mark.parametrize(
+    "windows,now,expected",
+    [
+        (["02:00-04:00"], datetime(2022, 1, 1, 3, 0), True),
+        (["02:00-04:00"], datetime(2022, 1, 1, 4, 0), False),
+        (["23:00-02:00"], datetime(2022, 1, 1, 1, 30), True),
+        (["23:00-02:00"], datetime(2022, 1, 1, 22, 59), False),
+        (["not-a-window", "10:00-11:00"], datetime(2022, 1, 1, 10, 15), True),
+        ([], datetime(2022, 1, 1, 10, 15), False),
+    ],
+)
+def test_in_maintenance_window(windows, now, expected):
+    assert in_maintenance_window(windows, now) == expected
+
+
+def test_estimate_bloat_ratio():
+    assert estimate_bloat_ratio(1000, 100, 10 * MB) == pytest.approx(1 - 100000 / (10 * MB))
+    assert estimate_bloat_ratio(1000, 100, 1024) is None
+    assert estimate_bloat_ratio(0, 100, 10 * MB) is None
+    assert estimate_bloat_ratio(10 * MB, 100, 10 * MB) == 0.0
+
+
+def test_maintenance_disabled_by_default(mocker, make_configuration, mock_database_query):
+    mock_query = mock_database_query(get_query_results())
+    MaintenanceManager(None).run(make_configuration(Maintenance={}))
+    assert not mock_query.called
+
+
+def test_maintenance_runs_jobs_in_window(mocker, make_configuration, mock_database_query):
+    mock_database_query(
+        get_query_results(
+            tables=[
+                ("public", "telemetry", 1000, 5000),
+                # Below the dead tuple thresholds, a plain VACUUM would not shrink it anyway
+                ("public", "clean", 1000, 10),
+            ],
+            indexes=[("public", "telemetry_pkey", 10 * MB, 1000, 8)],
+            active_backends=10,
+        )
+    )
+    mock_execute = mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    mocker.patch("src.maintenance.in_maintenance_window", return_value=True)
+    manager = MaintenanceManager(None)
+    manager.run(make_configuration(Maintenance={"Enabled": True, "Windows": ["00:00-23:59"]}))
+
+    assert mock_execute.call_count == 2
+    assert [(result.operation, result.relation) for result in manager.history] == [
+        ("reindex", "public.telemetry_pkey"),
+        ("vacuum", "public.telemetry"),
+    ]
+    assert all(result.succeeded and result.duration_seconds >= 0 for result in manager.history)
+
+
+def test_maintenance_postponed_when_busy(mocker, make_configuration, mock_database_query):
+    mock_database_query(get_query_results(tables=[("public", "telemetry", 1000, 5000)], active_backends=10))
+    mock_execute = mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    manager = MaintenanceManager(None)
+    manager.run(make_configuration(Maintenance={"Enabled": True}))
+
+    assert not mock_execute.called
+    assert not manager.history
+
+
+def test_maintenance_postponed_when_container_cpu_high(mocker, make_configuration, mock_database_query):
+    mock_database_query(get_query_results(tables=[("public", "telemetry", 1000, 5000)], active_backends=0))
+    mock_execute = mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch.object(docker.DockerClient.containers, "get", return_value=Container())
+    stats = {
+        "cpu_stats": {"cpu_usage": {"total_usage": 900}, "system_cpu_usage": 2000, "online_cpus": 1},
+        "precpu_stats": {"cpu_usage": {"total_usage": 100}, "system_cpu_usage": 1000},
+    }
+    mocker.patch.object(Container, "stats", return_value=stats)
+    MaintenanceManager(docker.DockerClient).run(
+        make_configuration(Maintenance={"Enabled": True, "MaxContainerCpuPercent": 50})
+    )
+
+    assert not mock_execute.called
+
+
+def test_maintenance_records_failed_job(mocker, make_configuration, mock_database_query):
+    mock_database_query(get_query_results(tables=[("public", "telemetry", 1000, 5000)], active_backends=0))
+    mocker.patch.object(MaintenanceManager, "_get_container_cpu_percent", return_value=None)
+    mocker.patch.object(DatabaseClient, "execute", side_effect=Exception("canceling statement"))
+    manager = MaintenanceManager(None)
+    manager.run(make_configuration(Maintenance={"Enabled": True}))
+
+    assert len(manager.history) == 1
+    assert not manager.history[0].succeeded
@@ -0,0 +1,14 @@
+import sys
+
+from src.manage_postgresql import add_database_jobs
+
+
+def test_database_jobs_disabled_without_driver(mocker, monkeypatch):
+    for module in ("src.database", "src.maintenance", "src.partitions", "src.probe", "src.query_statistics"):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+    monkeypatch.setitem(sys.modules, "psycopg2", None)
+    scheduler = mocker.Mock()
+    probe_scheduler = mocker.Mock()
+    assert add_database_jobs(None, scheduler, probe_scheduler, None, None) == []
+    assert not scheduler.add_job.called
+    assert not probe_scheduler.add_job.called
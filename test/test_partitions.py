@@ -0,0 +1,157 @@
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+from psycopg2 import sql
+from src.database import DatabaseClient
+from src.partitions import (
+    PARTITIONS_QUERY,
+    RANGE_PARTITIONED_QUERY,
+    TIME_COLUMN_TYPE_QUERY,
+    PartitionManager,
+    get_next_partition_start,
+    get_partition_name,
+    get_partition_start,
+    parse_partition_start,
+)
+
+NOW = datetime(2024, 12, 31, 13, 45, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize(
+    "interval,start,next_start,name",
+    [
+        ("hour", datetime(2024, 12, 31, 13), datetime(2024, 12, 31, 14), "telemetry_p2024123113"),
+        ("day", datetime(2024, 12, 31), datetime(2025, 1, 1), "telemetry_p20241231"),
+        ("week", datetime(2024, 12, 30), datetime(2025, 1, 6), "telemetry_p20241230"),
+        ("month", datetime(2024, 12, 1), datetime(2025, 1, 1), "telemetry_p202412"),
+    ],
+)
+def test_partition_intervals(interval, start, next_start, name):
+    start = start.replace(tzinfo=timezone.utc)
+    assert get_partition_start(NOW, interval) == start
+    assert get_next_partition_start(start, interval) == next_start.replace(tzinfo=timezone.utc)
+    assert get_partition_name("telemetry", start, interval) == name
+    assert parse_partition_start("telemetry", name, interval) == start
+
+
+def test_partition_names():
+    long_table = "t" * 70
+    name = get_partition_name(long_table, datetime(2024, 1, 31, tzinfo=timezone.utc), "day")
+    assert len(name) == 63
+    assert parse_partition_start(long_table, name, "day") == datetime(2024, 1, 31, tzinfo=timezone.utc)
+    assert parse_partition_start("telemetry", "telemetry_default", "day") is None
+    assert parse_partition_start("telemetry", "telemetry_p20241399", "day") is None
+    assert parse_partition_start("telemetry", "telemetry_p2024123113", "day") is None
+
+
+def test_partitioning_config_ignores_invalid_tables(make_configuration):
+    tables = make_configuration(
+        Partitioning={
+            "Enabled": True,
+            "Tables": [
+                {"Table": "telemetry", "TimeColumn": "ts"},
+                {"Table": "no_time_column"},
+                {"Table": "events", "TimeColumn": "ts", "PartitionInterval": "year"},
+                {"Table": "events", "TimeColumn": "ts", "ExpiredAction": "truncate"},
+            ],
+        }
+    ).get_partitioning_config()["Tables"]
+    assert [table["Table"] for table in tables] == ["telemetry"]
+    assert tables[0]["PartitionInterval"] == "day"
+    assert tables[0]["Premake"] == 3
+
+
+def get_query_results(time_column_type="timestamp with time zone"):
+    return {
+        RANGE_PARTITIONED_QUERY: [(True,)],
+        TIME_COLUMN_TYPE_QUERY: [(time_column_type,)],
+        PARTITIONS_QUERY: [("telemetry_p20241225",), ("telemetry_p20241231",), ("telemetry_default",)],
+    }
+
+
+@pytest.fixture()
+def mock_database(mocker, mock_database_query):
+    mocker.patch.object(DatabaseClient, "configure", return_value=None)
+    mock_database_query(get_query_results())
+    return mocker.patch.object(DatabaseClient, "execute", return_value=None)
+
+
+def test_partition_manager_creates_and_drops_partitions(mocker, mock_database, tmp_path, make_configuration):
+    mock_copy_to = mocker.patch.object(
+        DatabaseClient, "copy_to", side_effect=lambda statement, export_file: export_file.write(b"ts,value\n")
+    )
+    configuration = make_configuration(
+        Partitioning={
+            "Enabled": True,
+            "Tables": [
+                {"Table": "telemetry", "TimeColumn": "ts", "Premake": 1, "RetentionDays": 5, "ExportDirectory": str(tmp_path)}
+            ],
+        }
+    )
+    PartitionManager().run(configuration, NOW)
+
+    statements = [args[0] for args, _ in mock_database.call_args_list]
+    assert (
+        sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier("public", "telemetry_p20250101"), sql.Identifier("public", "telemetry")
+        )
+        in statements
+    )
+    # The existing partition gets its index as well, in case creating it failed before
+    brin_statements = [repr(statement) for statement in statements if "brin" in repr(statement)]
+    assert len(brin_statements) == 2
+    assert "telemetry_p20241231_brin" in brin_statements[0]
+    assert "telemetry_p20250101_brin" in brin_statements[1]
+    assert statements[-1] == sql.SQL("DROP TABLE {}").format(sql.Identifier("public", "telemetry_p20241225"))
+    assert mock_copy_to.call_count == 1
+    with gzip.open(tmp_path.joinpath("public.telemetry_p20241225.csv.gz")) as export_file:
+        assert export_file.read() == b"ts,value\n"
+
+
+def test_partition_manager_keeps_partition_when_export_fails(mocker, mock_database, tmp_path, make_configuration):
+    mocker.patch.object(DatabaseClient, "copy_to", side_effect=OSError("disk full"))
+    configuration = make_configuration(
+        Partitioning={
+            "Enabled": True,
+            "Tables": [{"Table": "telemetry", "TimeColumn": "ts", "RetentionDays": 5, "ExportDirectory": str(tmp_path)}],
+        }
+    )
+    PartitionManager().run(configuration, NOW)
+    assert not any("DROP" in repr(args[0]) for args, _ in mock_database.call_args_list)
+
+
+def test_partition_manager_detaches_partitions(mock_database, make_configuration):
+    configuration = make_configuration(
+        Partitioning={
+            "Enabled": True,
+            "Tables": [
+                {"Table": "telemetry", "TimeColumn": "ts", "Premake": 0, "RetentionDays": 5, "ExpiredAction": "detach"}
+            ],
+        }
+    )
+    PartitionManager().run(configuration, NOW)
+    assert mock_database.call_args_list[-1].args[0] == sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+        sql.Identifier("public", "telemetry"), sql.Identifier("public", "telemetry_p20241225")
+    )
+
+
+def test_partition_manager_skips_hourly_partitions_of_date_column(mock_database, make_configuration, mock_database_query):
+    mock_database_query(get_query_results(time_column_type="date"))
+    PartitionManager().run(
+        make_configuration(
+            Partitioning={"Enabled": True, "Tables": [{"Table": "telemetry", "TimeColumn": "ts", "PartitionInterval": "hour"}]}
+        ),
+        NOW,
+    )
+    assert not mock_database.called
+
+    PartitionManager().run(
+        make_configuration(Partitioning={"Enabled": True, "Tables": [{"Table": "telemetry", "TimeColumn": "ts"}]}), NOW
+    )
+    assert mock_database.called
+
+
+def test_partition_manager_disabled(mock_database, make_configuration):
+    PartitionManager().run(make_configuration(), NOW)
+    assert not mock_database.called
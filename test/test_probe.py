@@ -0,0 +1,97 @@
+import docker
+import psycopg2.errors
+import pytest
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+from docker.models.containers import Container, ContainerCollection
+from src.database import DatabaseClient
+from src.probe import WAIT_EVENTS_QUERY, LatencySketch, SloProbe
+
+
+def test_latency_sketch_quantiles():
+    sketch = LatencySketch()
+    for value in range(1, 10001):
+        sketch.add(value / 10)
+    assert sketch.count == 10000
+    assert sketch.quantile(0.5) == pytest.approx(500, rel=0.01)
+    assert sketch.quantile(0.99) == pytest.approx(990, rel=0.01)
+    assert LatencySketch().quantile(0.99) is None
+
+
+def test_latency_sketch_bounded_memory():
+    sketch = LatencySketch(max_buckets=64)
+    other = LatencySketch(max_buckets=64)
+    for exponent in range(-3000, 3000):
+        sketch.add(10 ** (exponent / 1000))
+        other.add(0)
+    sketch.merge(other)
+    assert len(sketch.buckets) == 64
+    assert sketch.count == 12000
+    # Rank 11939 is the 5939th of the non zero values
+    assert sketch.quantile(0.995) == pytest.approx(10**2.939, rel=0.01)
+    assert sketch.quantile(0.1) == 0.0
+
+
+@pytest.fixture()
+def mock_database(mocker):
+    mocker.patch.object(DatabaseClient, "configure", return_value=None)
+    mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    mocker.patch.object(DatabaseClient, "commit", return_value=None)
+    mocker.patch.object(DatabaseClient, "rollback", return_value=None)
+    wait_events = [("Lock", "relation", "active", 3)]
+    return mocker.patch.object(
+        DatabaseClient,
+        "query",
+        side_effect=lambda statement, params=None: wait_events if statement == WAIT_EVENTS_QUERY else [],
+    )
+
+
+@pytest.fixture()
+def probe(mocker):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mocker.patch("docker.DockerClient.containers", return_value=ContainerCollection())
+    mocker.patch.object(docker.DockerClient.containers, "get", return_value=Container())
+    mocker.patch.object(Container, "stats", return_value={"memory_stats": {"usage": 1024, "limit": 4096}})
+    return SloProbe(GreengrassCoreIPCClientV2(), docker.DockerClient)
+
+
+def test_probe_alerts_with_backoff_and_recovery(mocker, mock_database, probe, make_configuration):
+    mock_publish = mocker.patch.object(GreengrassCoreIPCClientV2, "publish_to_topic", return_value=None)
+    configuration = make_configuration(Probe={"Enabled": True, "SloMilliseconds": {"commit": 1e-9}, "MinSamples": 2})
+
+    probe.run(configuration)
+    assert not mock_publish.called
+    probe.run(configuration)
+    assert probe.get_latency_sketch("read").count == 2
+    assert probe.get_latency_sketch("commit").count == 2
+    alert = mock_publish.call_args.kwargs["publish_message"].json_message.message
+    assert mock_publish.call_args.kwargs["topic"] == "greengrass/postgresql/probe/alerts"
+    assert alert["event"] == "slo_breach"
+    assert alert["canary"] == "commit"
+    assert alert["samples"] == 2
+    assert alert["container"]["memory_usage_bytes"] == 1024
+    assert alert["wait_events"] == [{"wait_event_type": "Lock", "wait_event": "relation", "state": "active", "count": 3}]
+
+    # Repeated alerts wait for the cooldown
+    probe.run(configuration)
+    assert mock_publish.call_count == 1
+
+    probe.run(make_configuration(Probe={"Enabled": True, "SloMilliseconds": {"commit": 1e9}, "MinSamples": 2}))
+    assert mock_publish.call_count == 2
+    assert mock_publish.call_args.kwargs["publish_message"].json_message.message["event"] == "slo_recovered"
+
+
+def test_probe_records_statement_timeouts(mocker, mock_database, probe, make_configuration):
+    mocker.patch.object(DatabaseClient, "commit", side_effect=[None, psycopg2.errors.QueryCanceled("timeout")])
+    probe.run(make_configuration(Probe={"Enabled": True, "Canaries": ["commit"], "StatementTimeoutMilliseconds": 2000}))
+    sketch = probe.get_latency_sketch("commit")
+    assert sketch.count == 1
+    assert sketch.quantile(0.99) == pytest.approx(2000, rel=0.01)
+    assert probe.get_latency_sketch("write").count == 0
+    assert probe.get_latency_sketch("read").count == 0
+
+
+def test_probe_disabled(mocker, mock_database, probe, make_configuration):
+    mock_close = mocker.patch.object(DatabaseClient, "close", return_value=None)
+    probe.run(make_configuration())
+    assert mock_close.called
+    assert not mock_database.called
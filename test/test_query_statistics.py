@@ -0,0 +1,112 @@
+from awsiot.greengrasscoreipc.clientv2 import GreengrassCoreIPCClientV2
+from src.container import ContainerManagement
+from src.database import DatabaseClient
+from src.query_statistics import (
+    CREATE_EXTENSION_STATEMENT,
+    RESET_STATEMENT,
+    SAMPLE_QUERY,
+    QueryStatisticsReporter,
+    build_report,
+    compute_deltas,
+)
+
+
+def test_compute_deltas():
+    previous = {(1, 1, 10): ("SELECT 1", 5, 50.0, 2), (1, 1, 20): ("SELECT 2", 7, 70.0, 0)}
+    current = {
+        (1, 1, 10): ("SELECT 1", 9, 90.0, 6),
+        (1, 1, 20): ("SELECT 2", 7, 70.0, 0),
+        (1, 1, 30): ("SELECT 3", 2, 3.0, 1),
+    }
+    deltas = compute_deltas(previous, current)
+    assert deltas == [
+        {"queryid": "10", "query": "SELECT 1", "calls": 4, "total_time_ms": 40.0, "mean_time_ms": 10.0, "shared_blks_read": 4},
+        {"queryid": "30", "query": "SELECT 3", "calls": 2, "total_time_ms": 3.0, "mean_time_ms": 1.5, "shared_blks_read": 1},
+    ]
+
+
+def test_build_report_top_n():
+    deltas = compute_deltas(
+        {},
+        {
+            (1, 1, 10): ("SELECT slow", 1, 900.0, 0),
+            (1, 1, 20): ("SELECT often", 1000, 100.0, 0),
+            (1, 1, 30): ("SELECT reads", 10, 10.0, 5000),
+        },
+    )
+    report = build_report(deltas, 1, 8, 60)
+    assert report["top"]["total_time"][0]["queryid"] == "10"
+    assert report["top"]["mean_time"][0]["queryid"] == "10"
+    assert report["top"]["calls"][0]["queryid"] == "20"
+    assert report["top"]["shared_blks_read"][0]["queryid"] == "30"
+    assert "query" not in report["top"]["calls"][0]
+    assert report["queries"] == {"10": "SELECT s", "20": "SELECT o", "30": "SELECT r"}
+    assert report["interval_seconds"] == 60
+
+
+def test_query_statistics_reporter_publishes_deltas(mocker, make_configuration):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    ipc_client = GreengrassCoreIPCClientV2()
+    mock_publish = mocker.patch.object(GreengrassCoreIPCClientV2, "publish_to_topic", return_value=None)
+    samples = iter([[(1, 1, 10, "SELECT 1", 5, 50.0, 2)], [(1, 1, 10, "SELECT 1", 9, 90.0, 6)]])
+    mocker.patch.object(DatabaseClient, "query", side_effect=lambda statement, params=None: next(samples))
+    mock_execute = mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    configuration = make_configuration(QueryStatistics={"Enabled": True, "Topic": "some/topic", "ResetIntervalSeconds": 0})
+    reporter = QueryStatisticsReporter(ipc_client)
+
+    reporter.run(configuration)
+    assert not mock_publish.called
+    mock_execute.assert_called_with(CREATE_EXTENSION_STATEMENT)
+
+    reporter.run(configuration)
+    assert mock_publish.call_count == 1
+    kwargs = mock_publish.call_args.kwargs
+    assert kwargs["topic"] == "some/topic"
+    report = kwargs["publish_message"].json_message.message
+    assert report["top"]["calls"] == [
+        {"queryid": "10", "calls": 4, "total_time_ms": 40.0, "mean_time_ms": 10.0, "shared_blks_read": 4}
+    ]
+
+
+def test_query_statistics_reporter_resets_statistics(mocker, make_configuration):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    ipc_client = GreengrassCoreIPCClientV2()
+    mocker.patch.object(GreengrassCoreIPCClientV2, "publish_to_topic", return_value=None)
+    mocker.patch.object(DatabaseClient, "execute", return_value=None)
+    mock_query = mocker.patch.object(DatabaseClient, "query", return_value=[])
+    configuration = make_configuration(QueryStatistics={"Enabled": True, "ResetIntervalSeconds": 1})
+    reporter = QueryStatisticsReporter(ipc_client)
+    mocker.patch("time.monotonic", return_value=reporter._QueryStatisticsReporter__last_reset_time + 10)
+
+    reporter.run(configuration)
+    assert [call.args[0] for call in mock_query.call_args_list] == [SAMPLE_QUERY, RESET_STATEMENT]
+
+
+def test_query_statistics_disabled_by_default(mocker, make_configuration):
+    mock_query = mocker.patch.object(DatabaseClient, "query", return_value=[])
+    QueryStatisticsReporter(None).run(make_configuration(QueryStatistics={}))
+    assert not mock_query.called
+
+
+def test_query_statistics_preloads_library(mocker, make_configuration):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mocker.patch.object(ContainerManagement, "__init__", return_value=None)
+    container_management = ContainerManagement(None, None, None)
+    assert container_management._create_config_command(make_configuration(QueryStatistics={})) == ""
+    assert (
+        container_management._create_config_command(make_configuration(QueryStatistics={"Enabled": True}))
+        == " -c shared_preload_libraries=pg_stat_statements"
+    )
+
+
+def test_query_statistics_keeps_preloaded_libraries_of_custom_file(mocker, tmp_path, make_configuration):
+    mocker.patch("awsiot.greengrasscoreipc", return_value=None)
+    mocker.patch.object(ContainerManagement, "__init__", return_value=None)
+    conf_file = tmp_path.joinpath("postgresql.conf")
+    conf_file.write_text("shared_preload_libraries = 'pg_stat_statements'\nshared_preload_libraries = 'auto_explain, pg_cron'")
+    configuration = make_configuration(
+        QueryStatistics={"Enabled": True}, ConfigurationFiles={"postgresql.conf": str(conf_file)}
+    )
+    assert ContainerManagement(None, None, None)._create_config_command(configuration) == (
+        " -c shared_preload_libraries=auto_explain,pg_cron,pg_stat_statements -c config_file=/custom_files/postgresql.conf"
+    )
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from src.executor import BlockingExecutor
+from src.scheduler import Scheduler
+
+
+def test_scheduler_runs_due_jobs(mocker):
+    scheduler = Scheduler(BlockingExecutor(1, 10, "test"))
+    ok_job = mocker.Mock()
+    failing_job = mocker.Mock(side_effect=Exception("job failed"))
+    scheduler.add_job("failing", 0, failing_job)
+    scheduler.add_job("ok", 0, ok_job)
+    scheduler.add_job("later", 3600, mocker.Mock())
+
+    assert asyncio.run(scheduler.run_pending()) == pytest.approx(0, abs=1)
+    assert failing_job.called
+    assert ok_job.called
+
+
+def test_scheduler_first_run_delay(mocker):
+    scheduler = Scheduler(BlockingExecutor(1, 10, "test"))
+    delayed_job = mocker.Mock()
+    scheduler.add_job("delayed", 3600, delayed_job, delay_seconds=0)
+    assert asyncio.run(scheduler.run_pending()) == pytest.approx(3600, abs=1)
+    assert delayed_job.called
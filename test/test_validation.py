@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+from awsiot.greengrasscoreipc.model import GetConfigurationResponse
+from docker.models.containers import Container
+from src.configuration import ComponentConfiguration
+from src.container import ContainerManagement
+from src.executor import BlockingExecutor
+from src.validation import (
+    ConfigurationValidationError,
+    get_shared_preload_libraries,
+    load_settings_catalog,
+    validate_configuration_files,
+    validate_pg_hba_conf,
+    validate_pg_ident_conf,
+    validate_postgresql_conf,
+)
+
+VALID_POSTGRESQL_CONF = """
+# Memory
+shared_buffers = 128MB          # min 128kB
+work_mem = '4GB'
+max_connections 100
+fsync = of
+synchronous_commit = true
+wal_level = logical
+checkpoint_timeout = 5min
+unix_socket_permissions = 0777
+random_page_cost = 1.1
+log_line_prefix = '%m [%p] ''quoted'' '
+pg_stat_statements.max = 10000
+include_if_exists 'extra.conf'
+"""
+
+VALID_PG_HBA_CONF = """
+# TYPE  DATABASE        USER            ADDRESS                 METHOD
+local   all             all                                     trust
+host    all             all             127.0.0.1/32            scram-sha-256
+host    all             all             192.168.1.0 255.255.255.0 md5
+host    "db one",db2    +group          ::1/128                 cert clientcert=verify-full
+hostssl all             all             .example.com            scram-sha-256
+host    all             all             all                     scram-sha-256
+"""
+
+
+@pytest.fixture()
+def catalog():
+    return load_settings_catalog("15")
+
+
+def test_load_settings_catalog(catalog):
+    assert catalog["shared_buffers"] == {
+        "type": "integer",
+        "context": "postmaster",
+        "unit": "8kB",
+        "min": 16,
+        "max": 1073741823,
+    }
+    assert "datestyle" in catalog
+    assert load_settings_catalog("16") is not None
+    assert load_settings_catalog("9") is None
+
+
+def test_validate_postgresql_conf_valid(catalog):
+    assert validate_postgresql_conf(VALID_POSTGRESQL_CONF, catalog) == []
+
+
+@pytest.mark.parametrize("server_version", ["15", "16"])
+def test_catalog_accepts_compression_methods_of_the_image(server_version):
+    content = "wal_compression = zstd\ndefault_toast_compression = lz4\n"
+    assert validate_postgresql_conf(content, load_settings_catalog(server_version)) == []
+
+
+@pytest.mark.parametrize(
+    "line,error",
+    [
+        ("shared_bufers = 128MB", "unrecognized configuration parameter 'shared_bufers'"),
+        ("max_connections = 0", "value '0' is out of range for parameter 'max_connections' (1 .. 262143)"),
+        ("checkpoint_timeout = 10ms", "value '10ms' is out of range for parameter 'checkpoint_timeout' (30 .. 86400 s)"),
+        ("work_mem = 'lots'", "invalid value 'lots' for parameter 'work_mem', expected a number"),
+        ("work_mem = 4GiB", "invalid unit in '4GiB' for parameter 'work_mem'"),
+        ("seq_page_cost = 1MB", "invalid value '1MB' for parameter 'seq_page_cost', the parameter does not accept units"),
+        ("fsync = maybe", "parameter 'fsync' requires a Boolean value, got 'maybe'"),
+        ("wal_level = full", "invalid value 'full' for parameter 'wal_level', available values: minimal, replica, logical"),
+        ("block_size = 4096", "parameter 'block_size' cannot be changed"),
+        ("shared_buffers = ", "syntax error in 'shared_buffers ='"),
+    ],
+)
+def test_validate_postgresql_conf_invalid(catalog, line, error):
+    assert validate_postgresql_conf(f"# comment\n{line}\n", catalog) == [f"line 2: {error}"]
+
+
+def test_get_shared_preload_libraries():
+    assert get_shared_preload_libraries("max_connections = 100\n") == []
+    assert get_shared_preload_libraries(
+        "shared_preload_libraries = 'pg_cron'\nSHARED_PRELOAD_LIBRARIES = 'auto_explain, \"timescaledb\"' # last wins\n"
+    ) == ["auto_explain", "timescaledb"]
+    assert get_shared_preload_libraries("shared_preload_libraries = ''\n") == []
+
+
+def test_validate_postgresql_conf_without_catalog():
+    assert validate_postgresql_conf("shared_bufers = 128MB\n", None) == []
+    assert validate_postgresql_conf("shared_buffers 'unterminated\n", None) == [
+        "line 1: syntax error in 'shared_buffers 'unterminated'"
+    ]
+
+
+def test_validate_pg_hba_conf_valid():
+    assert validate_pg_hba_conf(VALID_PG_HBA_CONF) == []
+
+
+def test_validate_pg_hba_conf_skips_included_files(caplog):
+    content = "include hba.d/base.conf\ninclude_if_exists /etc/hba.conf\ninclude_dir hba.d\nlocal all all trust\n"
+    assert validate_pg_hba_conf(content) == []
+    assert "line 3: the file included by include_dir will not be validated" in caplog.text
+
+
+@pytest.mark.parametrize(
+    "line,error",
+    [
+        ("hosts all all all md5", "invalid connection type 'hosts'"),
+        ("local all all", "end-of-line before authentication method"),
+        ("host all all 10.0.0.0/24", "end-of-line before authentication method"),
+        ("local all all md6", "invalid authentication method 'md6'"),
+        ("host all all 10.0.0.0/40 md5", "invalid IP address '10.0.0.0/40'"),
+        ("host all all 10.0.0.1 md5", "specifying both host name and CIDR mask is invalid or IP mask missing for '10.0.0.1'"),
+        ("host all all bad_host! md5", "invalid IP address or host name 'bad_host!'"),
+        ("local all all peer map", "authentication option not in name=value format: 'map'"),
+    ],
+)
+def test_validate_pg_hba_conf_invalid(line, error):
+    assert validate_pg_hba_conf(f"# comment\n{line}\n") == [f"line 2: {error}"]
+
+
+def test_validate_pg_ident_conf():
+    assert validate_pg_ident_conf("# MAPNAME SYSTEM-USERNAME PG-USERNAME\nmymap root postgres\n") == []
+    assert validate_pg_ident_conf("include_if_exists ident.d/maps.conf\n") == []
+    assert validate_pg_ident_conf("mymap root\n") == [
+        "line 1: expected map name, system user name and database user name"
+    ]
+
+
+def get_configuration(tmp_path, postgresql_conf, pg_hba_conf):
+    tmp_path.joinpath("postgresql.conf").write_text(postgresql_conf)
+    tmp_path.joinpath("pg_hba.conf").write_text(pg_hba_conf)
+    configuration_response = GetConfigurationResponse(
+        value={
+            "ConfigurationFiles": {
+                "postgresql.conf": str(tmp_path.joinpath("postgresql.conf")),
+                "pg_hba.conf": str(tmp_path.joinpath("pg_hba.conf")),
+            }
+        }
+    )
+    return ComponentConfiguration(configuration_response, None)
+
+
+def test_validate_configuration_files(tmp_path):
+    validate_configuration_files(get_configuration(tmp_path, VALID_POSTGRESQL_CONF, VALID_PG_HBA_CONF))
+
+    with pytest.raises(ConfigurationValidationError) as err:
+        validate_configuration_files(get_configuration(tmp_path, "max_connections = 0\n", "local all all md6\n"))
+    message = err.value.args[0]
+    assert "postgresql.conf: line 1: value '0' is out of range for parameter 'max_connections'" in message
+    assert "pg_hba.conf: line 1: invalid authentication method 'md6'" in message
+
+
+def test_invalid_configuration_keeps_running_container(mocker, tmp_path):
+    mocker.patch.object(ContainerManagement, "__init__", return_value=None)
+    mock_stop_container = mocker.patch.object(Container, "stop", return_value=None)
+    mock_prepare_image = mocker.patch("src.image.ImageManagement.prepare_image", return_value=None)
+    container_management = ContainerManagement(None, None, None)
+    container_management.postgresql_container = Container()
+    container_management.executor = BlockingExecutor(1, 10, "test")
+    with pytest.raises(ConfigurationValidationError):
+        asyncio.run(
+            container_management.manage_postgresql_container(
+                get_configuration(tmp_path, "shared_bufers = 128MB\n", VALID_PG_HBA_CONF)
+            )
+        )
+    assert not mock_prepare_image.called
+    assert not mock_stop_container.called
@@ -0,0 +1,92 @@
+"""
+Generates the settings catalog of a PostgreSQL major version from the pg_settings view of a running server. The catalog
+has to be generated from the official image the component runs, as the accepted values of some settings depend on the
+build options, e.g. lz4 and zstd for wal_compression and default_toast_compression:
+
+    docker run -d --name catalog -e POSTGRES_PASSWORD=postgres -p 5433:5432 postgres:16
+    python tools/generate_settings_catalog.py "host=localhost port=5433 user=postgres password=postgres" \
+        src/settings_catalog/16.json
+    docker rm -f catalog
+"""
+import argparse
+import json
+import sys
+
+import psycopg2
+
+SETTINGS_QUERY = """
+SELECT name, vartype, unit, min_val, max_val, enumvals, context
+FROM pg_settings
+ORDER BY lower(name)
+"""
+
+# Compression methods of the official images, missing if the server was built without them.
+REQUIRED_ENUM_VALUES = {"wal_compression": ["lz4", "zstd"], "default_toast_compression": ["lz4"]}
+
+
+def get_settings_catalog(connection) -> dict:
+    """
+    Reads the settings of the server into the catalog format used by src/validation.py.
+
+    Args
+        connection: Connection to the server.
+
+    Returns
+        Settings keyed by their name
+    """
+    catalog = {}
+    with connection.cursor() as cursor:
+        cursor.execute(SETTINGS_QUERY)
+        for name, vartype, unit, min_val, max_val, enumvals, context in cursor.fetchall():
+            setting = {"type": vartype, "context": context}
+            if unit:
+                setting["unit"] = unit
+            if vartype in ("integer", "real"):
+                convert = int if vartype == "integer" else float
+                setting["min"] = convert(min_val)
+                setting["max"] = convert(max_val)
+            if vartype == "enum":
+                setting["values"] = enumvals
+            catalog[name] = setting
+    return catalog
+
+
+def get_missing_enum_values(catalog: dict) -> list:
+    "Returns the compression methods of the official images the server does not accept"
+    return [
+        f"{name}={value}"
+        for name, values in REQUIRED_ENUM_VALUES.items()
+        for value in values
+        if name in catalog and value not in catalog[name]["values"]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the settings catalog of a PostgreSQL server.")
+    parser.add_argument("dsn", help="libpq connection string of the server")
+    parser.add_argument("output", help="path of the catalog file, e.g. src/settings_catalog/16.json")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.dsn)
+    try:
+        catalog = get_settings_catalog(connection)
+    finally:
+        connection.close()
+
+    missing_values = get_missing_enum_values(catalog)
+    if missing_values:
+        sys.exit(
+            "The server was built without: {}. Generate the catalog from the official image.".format(
+                ", ".join(missing_values)
+            )
+        )
+
+    # One setting per line keeps the catalog diffs between versions readable
+    with open(args.output, "w") as catalog_file:
+        catalog_file.write(
+            "{\n" + ",\n".join(f"  {json.dumps(name)}: {json.dumps(setting)}" for name, setting in catalog.items()) + "\n}\n"
+        )
+
+
+if __name__ == "__main__":
+    main()